@@ -0,0 +1,35 @@
+import os
+from storage import read_parquet
+
+# Report of the asseverazione PDFs the checks read: only a candidatura missing from it has no document
+DOCUMENT_REPORT = 'Stato_Checklist_Asseverazione'
+
+NOT_SUPPORTED = 'Controllo non supportato'
+
+# Checklist check -> environment variable with the report written by its script in script/
+CHECK_REPORTS = {
+    'Stato_CUP': 'CUP_REPORT_PATH',
+    'Stato_Anagrafica_SA': 'ANAGRAFICA_REPORT_PATH',
+}
+
+def load_check_reports():
+    # Reports of the checks that have been run: Candidatura and the status of the check
+    reports = {}
+    for check, env in CHECK_REPORTS.items():
+        path = os.getenv(env)
+        if path:
+            reports[check] = read_parquet(path, columns=['Candidatura', check])
+    return reports
+
+def check_status(reconciled, check, index):
+    # Status of a check aligned on index. A candidatura missing from the check report but with its PDF
+    # was skipped by the script (file name not recognised, run on a subset): the check was not done,
+    # the document is there. It is 'Documento non presente' only when the PDF is missing, either
+    # absent from the document report or listed there as missing
+    from reconciliation import MISSING_DOCUMENT
+    if check not in reconciled.reports:
+        return NOT_SUPPORTED
+    status = reconciled.reports[check][check].reindex(index)
+    skipped = index.isin(reconciled.missing[check])
+    no_document = (reconciled.reports[DOCUMENT_REPORT]['Status'].reindex(index) == MISSING_DOCUMENT).to_numpy()
+    return status.mask(skipped & no_document, MISSING_DOCUMENT).mask(skipped & ~no_document, NOT_SUPPORTED)
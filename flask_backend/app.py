@@ -1,14 +1,24 @@
 import os
+import sys
 import pandas as pd
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 from dotenv import load_dotenv
 
+# Modules shared with the frontends and scripts live in the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from reconciliation import reconcile
+from status_vocabulary import POSSIBLE_VALUES_DOCUMENTI, POSSIBLE_VALUES_CHECKLIST
+from storage import read_parquet, read_excel
+from check_reports import load_check_reports, check_status
+from metrics import init_metrics, phase
+
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+init_metrics(app)
 
 def determine_stato_checklist(row):
     if row['Stato_Firma_Asseveratore'] == 'Documento non presente':
@@ -43,8 +53,10 @@ def load_data():
     try:
         parquet_path = os.getenv('PARQUET_PATH')
         excel_path = os.getenv('EXCEL_PATH')
-        candidature_checklist = pd.read_parquet(parquet_path)
-        file_status_report = pd.read_excel(excel_path)
+        with phase('load'):
+            # Paths can be s3:// URIs; only the candidature column of the master list is read
+            candidature_checklist = read_parquet(parquet_path, columns=['Candidatura'])
+            file_status_report = read_excel(excel_path)
         return candidature_checklist, file_status_report
     except Exception as e:
         app.logger.error(f"Error loading data: {e}")
@@ -55,38 +67,28 @@ def generate_data():
     if candidature_checklist is None or file_status_report is None:
         return None, None
 
-    file_status_report.set_index('Candidatura', inplace=True)
+    # Align the report on the master list: candidature without a PDF become 'Documento non presente'.
+    # The reports of the checks run by the scripts (CUP_REPORT_PATH, ...) are aligned with it
+    reconciled = reconcile(candidature_checklist, {'Stato_Checklist_Asseverazione': file_status_report, **load_check_reports()})
+    file_status_report = reconciled.reports['Stato_Checklist_Asseverazione']
+    app.logger.info(f"Candidature senza documento: {len(reconciled.missing['Stato_Checklist_Asseverazione'])}, "
+                    f"documenti orfani: {len(reconciled.orphans['Stato_Checklist_Asseverazione'])}")
 
-    possible_values_documenti = {
-        "Stato_Contratto_SA_SR":                                ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Determina_Affidamento_Aggiudicazione_Servizio":  ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Proposta_Commerciale":                           ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Documento_Stipula_MEPA":                         ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Convenzione_Accordo":                            ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Checklist_Asseverazione":                        ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Certificato_Regolare_Esec":                      ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Allegato_5":                                     ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-    }
+    possible_values_documenti = POSSIBLE_VALUES_DOCUMENTI
 
     columns_documenti = list(possible_values_documenti.keys())
 
-    possible_values_checklist = {
-        "Stato_CUP":                    ['Codice corretto',                     'Codice errato', 'Codice assente',      'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
-        "Stato_Firma_Asseveratore":     ['Firma presente', 'Documento p7m',     'Firma assente',                        'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
-        "Stato_Anagrafica_SA":          ['Dati corretti',                       'Dati non corrispondenti',              'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
-        "Stato_Compilazione_Checklist": ['Compilazione corretta',               'Compilazione errata',                  'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
-        "Esito_Conformità_Tecnica":     ['Positivo',                            'Negativo', 'Campo nullo',              'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente']
-    }
+    possible_values_checklist = POSSIBLE_VALUES_CHECKLIST
 
     columns_checklist = list(possible_values_checklist.keys())
 
     df_checklist = pd.DataFrame(index=file_status_report.index, columns=columns_checklist)
     df = pd.DataFrame(index=file_status_report.index, columns=columns_documenti)
 
-    df_checklist['Stato_CUP'] = 'Controllo non supportato'
+    df_checklist['Stato_CUP'] = check_status(reconciled, 'Stato_CUP', df_checklist.index)
     df_checklist['Stato_Firma_Asseveratore'] = file_status_report['Status']
     df_checklist.loc[df_checklist['Stato_Firma_Asseveratore'] == 'EOF marker not found', 'Stato_Firma_Asseveratore'] = 'Errore nel controllo'
-    df_checklist['Stato_Anagrafica_SA'] = 'Controllo non supportato'
+    df_checklist['Stato_Anagrafica_SA'] = check_status(reconciled, 'Stato_Anagrafica_SA', df_checklist.index)
     df_checklist['Stato_Compilazione_Checklist'] = 'Controllo non supportato'
     df_checklist['Esito_Conformità_Tecnica'] = file_status_report['Esito']
     df_checklist.loc[df_checklist['Esito_Conformità_Tecnica'] == 'EOF marker not found', 'Esito_Conformità_Tecnica'] = 'Errore nel controllo'
@@ -110,7 +112,19 @@ def get_data():
     df, df_checklist = generate_data()
     if df is None or df_checklist is None:
         return jsonify({'error': 'Data generation failed'}), 500
-    return jsonify({'df': df.to_dict(), 'df_checklist': df_checklist.to_dict()})
+    with phase('serialize'):
+        return jsonify({'df': df.to_dict(), 'df_checklist': df_checklist.to_dict()})
+
+@app.route('/api/reconciliation', methods=['GET'])
+def get_reconciliation():
+    candidature_checklist, file_status_report = load_data()
+    if candidature_checklist is None or file_status_report is None:
+        return jsonify({'error': 'Data generation failed'}), 500
+    reconciled = reconcile(candidature_checklist, {'Stato_Checklist_Asseverazione': file_status_report, **load_check_reports()})
+    return jsonify({
+        'missing': {name: index.tolist() for name, index in reconciled.missing.items()},
+        'orphans': {name: index.tolist() for name, index in reconciled.orphans.items()},
+    })
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -1,20 +1,39 @@
 import os
-import pandas as pd
-from flask import Flask, jsonify, request
+import sys
+import time
+import threading
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 from dotenv import load_dotenv
-from pymongo import MongoClient
+
+# Modules shared with the frontends and scripts live in the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from status_vocabulary import POSSIBLE_VALUES_DOCUMENTI, POSSIBLE_VALUES_CHECKLIST, vocabulary
+from storage import local_path, read_parquet, read_excel
+from check_reports import load_check_reports, check_status
 from config import Config
 from db import get_db, close_db
+from metrics import init_metrics, phase, record_cache, READY, WARM_UP_DURATION
+from shared_dataset import SharedDataset, get_shared_dataset, source_version, version_token
+from store import get_store, close_store, save_lavorata, load_lavorate, is_lavorata
+from feedback import get_feedback_writer, apply_feedback
+from history import snapshot_from_table, write_snapshot, list_runs, diff_snapshots
+from lean_json import iter_documents
+from single_flight import SingleFlight, stale_while_revalidate
+from export import EXPORT_FORMATS, stream_export
 import json
+from datetime import date
+import pyarrow as pa
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    init_metrics(app)
 
     @app.teardown_appcontext
     def teardown_db(exception):
         close_db()
+        close_store()
     return app
 
 def determine_stato_checklist(row):
@@ -50,8 +69,9 @@ def load_data():
     try:
         parquet_path = os.getenv('PARQUET_PATH')
         excel_path = os.getenv('EXCEL_PATH')
-        candidature_checklist = pd.read_parquet(parquet_path)
-        file_status_report = pd.read_excel(excel_path)
+        # Paths can be s3:// URIs; only the candidature column of the master list is read
+        candidature_checklist = read_parquet(parquet_path, columns=['Candidatura'])
+        file_status_report = read_excel(excel_path)
         return candidature_checklist, file_status_report
     except Exception as e:
         app.logger.error(f"Error loading data: {e}")
@@ -63,81 +83,169 @@ def load_data():
 #     candidature_ids = [doc['candidatureId'] for doc in candidature]
 #     return {'candidature_ids': candidature_ids}
 
+# Parsed JSON files keyed by name, reused until the file on disk changes
+_cache = {}
+_loads = {name: SingleFlight(name) for name in ('candidature', 'candidatura', 'matrix', 'bitmap_index')}
+
+def read_json(path):
+    with phase('load'):
+        with open(path, 'rb') as json_file:
+            raw = json_file.read()
+    with phase('parse'):
+        return json.loads(raw)
+
+def load_cached(name, path, build, read=read_json):
+    version = source_version(path)
+    cached = _cache.get(name)
+    if cached is not None and cached[0] == version:
+        record_cache(name, True)
+        return cached[1]
+    record_cache(name, False)
+
+    def load():
+        query_result = read(path)
+        with phase('index'):
+            data = build(query_result, version)
+        _cache[name] = (version, data)
+        return data
+
+    # Concurrent misses share one load; once a version is cached, callers keep getting it while the new one loads
+    stale = cached[1] if cached is not None and stale_while_revalidate() else None
+    return _loads[name].do(version, load, stale)
+
 def load_candidature():
     try:
         # Path to the JSON file
-        candidature_path = os.getenv('CANDIDATURE_PATH')
+        candidature_path = local_path(os.getenv('CANDIDATURE_PATH'))
 
-        # Load the JSON file
-        with open(candidature_path, 'r') as json_file:
-            query_result = json.load(json_file)
-
-        # app.logger.info(f"Loaded data: {query_result}")
         # Extract candidatureIds
-        candidature_ids = [doc['candidatureId'] for doc in query_result]
-
-        # app.logger.info(f"Extracted candidature_ids: {candidature_ids}")
-
-        return candidature_ids
+        return load_cached('candidature', candidature_path, lambda query_result, version: [doc['candidatureId'] for doc in query_result])
 
     except Exception as e:
         app.logger.error(f"Error loading data: {e}")
         return None
 
+# Documents grouped by candidatureId, with the source version they were read from
+class CandidaturaIndex(dict):
+    version = None
+
+    def get_many(self, candidature_ids, columns=None):
+        # The records are already in memory, so they are returned whole
+        return [self.get(candidature_id, []) for candidature_id in candidature_ids]
+
+def index_candidatura(query_result, version=None):
+    # Group the documents by candidatureId so a detail request is a dict lookup
+    index = CandidaturaIndex()
+    index.version = version
+    for doc in query_result:
+        index.setdefault(doc['candidatureId'], []).append(doc)
+    return index
+
 def load_candidatura():
     try:
         # Path to the JSON file
-        candidatura_path = os.getenv('CANDIDATURA_PATH')
+        candidatura_path = local_path(os.getenv('CANDIDATURA_PATH'))
 
-        # Load the JSON file
-        with open(candidatura_path, 'r') as json_file:
-            query_result = json.load(json_file)
+        # With several workers the dataset is mapped from a shared Arrow file instead
+        shared_path = os.getenv('SHARED_DATASET_PATH')
+        if shared_path:
+            return get_shared_dataset(candidatura_path, shared_path)
 
-        # app.logger.info(f"Loaded data: {query_result}")
-
-        return query_result
+        # Streamed into interned, compact records: parsing happens while the index is built
+        return load_cached('candidatura', candidatura_path, index_candidatura, read=iter_documents)
 
     except Exception as e:
         app.logger.error(f"Error loading data: {e}")
         return None
 
+# Status matrix built from the dataset object it was derived from
+_matrix = (None, None)
+
+def load_matrix():
+    candidatura = load_candidatura()
+    if candidatura is None:
+        return None
+    if _matrix[0] is candidatura:
+        record_cache('matrix', True)
+        return _matrix[1]
+    record_cache('matrix', False)
+
+    def build():
+        global _matrix
+        from matrix import StatusMatrix
+        with phase('index'):
+            if isinstance(candidatura, SharedDataset):
+                documents = candidatura.table.select(['candidatureId', 'documentClass', 'esitoCheckReason']).to_pandas()
+            else:
+                documents = [(doc['candidatureId'], doc['documentClass'], doc['esitoCheckReason']) for docs in candidatura.values() for doc in docs]
+            matrix = StatusMatrix(documents)
+        _matrix = (candidatura, matrix)
+        return matrix
+
+    stale = _matrix[1] if stale_while_revalidate() else None
+    return _loads['matrix'].do(candidatura.version, build, stale)
+
+def dataset_table(candidatura):
+    if isinstance(candidatura, SharedDataset):
+        return candidatura.table
+    return pa.Table.from_pylist([dict(doc) for docs in candidatura.values() for doc in docs])
+
+# Bitmap index, updated in place of a rebuild when the dataset object changes
+_bitmap_index = (None, None)
+
+def load_bitmap_index():
+    candidatura = load_candidatura()
+    if candidatura is None:
+        return None
+    if _bitmap_index[0] is candidatura:
+        record_cache('bitmap_index', True)
+        return _bitmap_index[1]
+    record_cache('bitmap_index', False)
+
+    def build():
+        global _bitmap_index
+        from bitmap_index import BitmapIndex
+        index = _bitmap_index[1] or BitmapIndex()
+        with phase('index'):
+            index.update(snapshot_from_table(dataset_table(candidatura)).to_pandas())
+        _bitmap_index = (candidatura, index)
+        return index
+
+    # update() builds a new immutable version and swaps it in, so until then the index answers for the previous one
+    stale = _bitmap_index[1] if stale_while_revalidate() else None
+    return _loads['bitmap_index'].do(candidatura.version, build, stale)
+
 def generate_data():
+    # pandas (and the modules built on it) is only imported by the endpoints that use it,
+    # so that the JSON endpoints start without paying for it
+    import pandas as pd
+    from reconciliation import reconcile
     candidature_checklist, file_status_report = load_data()
     if candidature_checklist is None or file_status_report is None:
         return None, None
 
-    file_status_report.set_index('Candidatura', inplace=True)
-
-    possible_values_documenti = {
-        "Stato_Contratto_SA_SR":                                ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Determina_Affidamento_Aggiudicazione_Servizio":  ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Proposta_Commerciale":                           ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Documento_Stipula_MEPA":                         ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Convenzione_Accordo":                            ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Checklist_Asseverazione":                        ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Certificato_Regolare_Esec":                      ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Allegato_5":                                     ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-    }
+    # Align the report on the master list: candidature without a PDF become 'Documento non presente'.
+    # The reports of the checks run by the scripts (CUP_REPORT_PATH, ...) are aligned with it
+    reconciled = reconcile(candidature_checklist, {'Stato_Checklist_Asseverazione': file_status_report, **load_check_reports()})
+    file_status_report = reconciled.reports['Stato_Checklist_Asseverazione']
+    app.logger.info(f"Candidature senza documento: {len(reconciled.missing['Stato_Checklist_Asseverazione'])}, "
+                    f"documenti orfani: {len(reconciled.orphans['Stato_Checklist_Asseverazione'])}")
+
+    possible_values_documenti = POSSIBLE_VALUES_DOCUMENTI
 
     columns_documenti = list(possible_values_documenti.keys())
 
-    possible_values_checklist = {
-        "Stato_CUP":                    ['Codice corretto',                     'Codice errato', 'Codice assente',      'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
-        "Stato_Firma_Asseveratore":     ['Firma presente', 'Documento p7m',     'Firma assente',                        'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
-        "Stato_Anagrafica_SA":          ['Dati corretti',                       'Dati non corrispondenti',              'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
-        "Stato_Compilazione_Checklist": ['Compilazione corretta',               'Compilazione errata',                  'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
-        "Esito_Conformità_Tecnica":     ['Positivo',                            'Negativo', 'Campo nullo',              'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente']
-    }
+    possible_values_checklist = POSSIBLE_VALUES_CHECKLIST
 
     columns_checklist = list(possible_values_checklist.keys())
 
     df_checklist = pd.DataFrame(index=file_status_report.index, columns=columns_checklist)
     df = pd.DataFrame(index=file_status_report.index, columns=columns_documenti)
 
-    df_checklist['Stato_CUP'] = 'Controllo non supportato'
+    df_checklist['Stato_CUP'] = check_status(reconciled, 'Stato_CUP', df_checklist.index)
     df_checklist['Stato_Firma_Asseveratore'] = file_status_report['Status']
     df_checklist.loc[df_checklist['Stato_Firma_Asseveratore'] == 'EOF marker not found', 'Stato_Firma_Asseveratore'] = 'Errore nel controllo'
-    df_checklist['Stato_Anagrafica_SA'] = 'Controllo non supportato'
+    df_checklist['Stato_Anagrafica_SA'] = check_status(reconciled, 'Stato_Anagrafica_SA', df_checklist.index)
     df_checklist['Stato_Compilazione_Checklist'] = 'Controllo non supportato'
     df_checklist['Esito_Conformità_Tecnica'] = file_status_report['Esito']
     df_checklist.loc[df_checklist['Esito_Conformità_Tecnica'] == 'EOF marker not found', 'Esito_Conformità_Tecnica'] = 'Errore nel controllo'
@@ -167,7 +275,8 @@ def get_data():
     candidature_ids = load_candidature()
     if candidature_ids is None:
         return jsonify({'error': 'Data generation failed'}), 500
-    return jsonify({'candidature_ids': candidature_ids})
+    with phase('serialize'):
+        return jsonify({'candidature_ids': candidature_ids})
 
 @app.route('/api/detail/<id_candidatura>', methods=['GET'])
 def get_detail(id_candidatura):
@@ -175,8 +284,224 @@ def get_detail(id_candidatura):
     if candidatura is None:
         return jsonify({'error': 'Data generation failed'}), 500
 
-    filtered_data = [doc for doc in candidatura if doc['candidatureId'] == id_candidatura]
-    return jsonify({'query': filtered_data})
+    filtered_data = candidatura.get(id_candidatura, [])
+    try:
+        filtered_data = apply_feedback(filtered_data, get_store(), get_feedback_writer())
+    except Exception as e:
+        app.logger.error(f"Error reading feedback: {e}")
+        return jsonify({'error': 'Feedback read failed'}), 500
+    filtered_data = [dict(doc) for doc in filtered_data]
+    # Lets clients memoize what they derive from the documents of a dataset version.
+    # It is the version served, which lags the file while a new one is loading
+    version = version_token(candidatura.version)
+    with phase('serialize'):
+        return jsonify({'query': filtered_data, 'version': version})
+
+# API exposing the status labels with their colour and severity
+@app.route('/api/vocabulary', methods=['GET'])
+def get_vocabulary():
+    return jsonify({'statuses': vocabulary()})
+
+# API to page through the whole status matrix, sorting and filtering on the server
+@app.route('/api/matrix', methods=['GET'])
+def get_matrix():
+    matrix = load_matrix()
+    if matrix is None:
+        return jsonify({'error': 'Data generation failed'}), 500
+
+    selection = matrix_selection(matrix)
+    if 'error' in selection:
+        return jsonify(selection), 400
+    page_args = paging(request.args)
+    if 'error' in page_args:
+        return jsonify(page_args), 400
+    with phase('index'):
+        page = matrix.page(**page_args, **selection)
+    with phase('serialize'):
+        return jsonify(page)
+
+MAX_PAGE_LIMIT = 10000
+
+def paging(args):
+    # offset and limit of the paged endpoints, from the query string or a JSON body
+    try:
+        offset = int(args.get('offset', 0))
+        limit = int(args.get('limit', 100))
+    except (TypeError, ValueError):
+        return {'error': 'offset and limit must be integers'}
+    if offset < 0 or not 1 <= limit <= MAX_PAGE_LIMIT:
+        return {'error': f'offset must be >= 0 and limit between 1 and {MAX_PAGE_LIMIT}'}
+    return {'offset': offset, 'limit': limit}
+
+def matrix_selection(matrix):
+    # sort, order, q and the column filters shared by /api/matrix and /api/export
+    sort = request.args.get('sort', 'candidatureId')
+    if sort != 'candidatureId' and sort not in matrix.columns:
+        return {'error': f'Unknown column {sort}'}
+    # Any other parameter named after a column filters it on a comma separated list of statuses
+    filters = {column: request.args[column].split(',') for column in matrix.columns if request.args.get(column)}
+    return {
+        'sort': sort,
+        'ascending': request.args.get('order', 'asc') != 'desc',
+        'filters': filters,
+        'prefix': request.args.get('q'),
+    }
+
+# API streaming the filtered matrix with the checklist details as CSV, XLSX or Parquet
+@app.route('/api/export', methods=['GET'])
+def get_export():
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unknown format {export_format}, expected one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+    matrix = load_matrix()
+    candidatura = load_candidatura()
+    if matrix is None or candidatura is None:
+        return jsonify({'error': 'Data generation failed'}), 500
+    selection = matrix_selection(matrix)
+    if 'error' in selection:
+        return jsonify(selection), 400
+
+    with phase('index'):
+        candidature_ids = matrix.ids[matrix.select(**selection)]
+    # Rows are read from the dataset while the body is being sent
+    body = stream_export(export_format, candidature_ids, candidatura, matrix.columns, list(POSSIBLE_VALUES_CHECKLIST))
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f"controlli_{date.today().strftime('%Y%m%d')}.{extension}"
+    return Response(body, mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+# API for multi-criteria status queries, e.g.
+# {"query": {"and": [{"field": "Stato_Firma_Asseveratore", "value": "Firma assente"},
+#                    {"field": "Esito_Conformità_Tecnica", "value": "Negativo"}]}, "offset": 0, "limit": 100}
+@app.route('/api/query', methods=['POST'])
+def post_query():
+    from bitmap_index import QueryError
+    payload = request.get_json(silent=True) or {}
+    if 'query' not in payload:
+        return jsonify({'error': 'query is required'}), 400
+
+    page_args = paging(payload)
+    if 'error' in page_args:
+        return jsonify(page_args), 400
+
+    index = load_bitmap_index()
+    if index is None:
+        return jsonify({'error': 'Data generation failed'}), 500
+    try:
+        with phase('index'):
+            result = index.query(payload['query'], **page_args)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    with phase('serialize'):
+        return jsonify(result)
+
+@app.route('/api/query/keys', methods=['GET'])
+def get_query_keys():
+    index = load_bitmap_index()
+    if index is None:
+        return jsonify({'error': 'Data generation failed'}), 500
+    return jsonify({'keys': index.keys()})
+
+# API to record the status matrix of the current control run and compare runs
+@app.route('/api/history/runs', methods=['GET'])
+def get_history_runs():
+    return jsonify({'runs': list_runs()})
+
+@app.route('/api/history/snapshot', methods=['POST'])
+def post_history_snapshot():
+    payload = request.get_json(silent=True) or {}
+    run_date = payload.get('run_date', date.today().strftime('%Y%m%d'))
+
+    candidatura = load_candidatura()
+    if candidatura is None:
+        return jsonify({'error': 'Data generation failed'}), 500
+    try:
+        rows = write_snapshot(snapshot_from_table(dataset_table(candidatura)), run_date)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Error writing snapshot: {e}")
+        return jsonify({'error': 'Snapshot write failed'}), 500
+    return jsonify({'run_date': run_date, 'rows': rows}), 201
+
+@app.route('/api/history/diff', methods=['GET'])
+def get_history_diff():
+    run_from = request.args.get('da')
+    run_to = request.args.get('a')
+    runs = list_runs()
+    if run_from not in runs or run_to not in runs:
+        return jsonify({'error': 'Unknown run, see /api/history/runs'}), 404
+    page_args = paging(request.args)
+    if 'error' in page_args:
+        return jsonify(page_args), 400
+
+    with phase('index'):
+        diff = diff_snapshots(
+            run_from, run_to,
+            status_from=request.args.get('da_stato'),
+            status_to=request.args.get('a_stato'),
+            check=request.args.get('check'),
+            **page_args,
+        )
+    with phase('serialize'):
+        return jsonify(diff)
+
+# API to annotate a document, acknowledged once the edit is in the write-ahead log
+@app.route('/api/detail/<id_candidatura>/<document_class>', methods=['PATCH'])
+def patch_document(id_candidatura, document_class):
+    payload = request.get_json(silent=True) or {}
+    user_feedback = payload.get('userFeedback')
+    username = payload.get('username')
+    # Anything but strings would be acknowledged, then rejected by the store at commit time
+    if not isinstance(user_feedback, str) or not isinstance(username, str) or not username:
+        return jsonify({'error': 'userFeedback and username are required, as strings'}), 400
+
+    candidatura = load_candidatura()
+    if candidatura is None:
+        return jsonify({'error': 'Data generation failed'}), 500
+    if not any(doc['documentClass'] == document_class for doc in candidatura.get(id_candidatura, [])):
+        return jsonify({'error': 'Document not found'}), 404
+
+    try:
+        entry = get_feedback_writer().submit(id_candidatura, document_class, user_feedback, username)
+    except Exception as e:
+        app.logger.error(f"Error writing feedback: {e}")
+        return jsonify({'error': 'Feedback write failed'}), 500
+    return jsonify(entry)
+
+# API to read and mark the candidature already processed by a reviewer
+@app.route('/api/lavorate', methods=['GET'])
+def get_lavorate():
+    try:
+        candidature_ids = load_lavorate(get_store())
+    except Exception as e:
+        app.logger.error(f"Error reading store: {e}")
+        return jsonify({'error': 'Store read failed'}), 500
+    return jsonify({'candidature_ids': sorted(candidature_ids)})
+
+@app.route('/api/lavorate/<candidature_id>', methods=['GET'])
+def get_lavorata(candidature_id):
+    try:
+        lavorata = is_lavorata(get_store(), candidature_id)
+    except Exception as e:
+        app.logger.error(f"Error reading store: {e}")
+        return jsonify({'error': 'Store read failed'}), 500
+    return jsonify({'candidatureId': candidature_id, 'lavorata': lavorata})
+
+@app.route('/api/lavorate', methods=['POST'])
+def post_lavorata():
+    payload = request.get_json(silent=True) or {}
+    candidature_id = payload.get('candidatureId')
+    username = payload.get('username')
+    if not candidature_id or not username:
+        return jsonify({'error': 'candidatureId and username are required'}), 400
+
+    try:
+        created = save_lavorata(get_store(), candidature_id, username)
+    except Exception as e:
+        app.logger.error(f"Error writing store: {e}")
+        return jsonify({'error': 'Store write failed'}), 500
+    return jsonify({'candidatureId': candidature_id}), 201 if created else 200
 
 # @app.route('/api/detail/<id_candidatura>', methods=['GET'])
 # def get_detail(id_candidatura):
@@ -187,5 +512,79 @@ def get_detail(id_candidatura):
 #     df_candidatura_checklist = df_checklist.loc[id_candidatura,:]
 #     return jsonify({'df': df_candidatura.to_dict(), 'df_checklist': df_checklist.to_dict()})
 
+# Liveness: the process is up and serving requests
+@app.route('/healthz', methods=['GET'])
+def get_healthz():
+    return jsonify({'status': 'ok'})
+
+# Readiness: the dataset has been loaded by the warm-up, so the first request does not pay for it
+@app.route('/readyz', methods=['GET'])
+def get_readyz():
+    if _warm_up['error']:
+        return jsonify({'status': 'failed', 'error': _warm_up['error']}), 503
+    if not _warm_up['ready']:
+        return jsonify({'status': 'warming up'}), 503
+    return jsonify({'status': 'ready', 'seconds': _warm_up['seconds']})
+
+# WARM_UP=0 leaves every load to the first request, WARM_UP=all also builds the matrix and bitmap index.
+# The state belongs to the process (pid) that runs the warm-up, like the feedback writer
+_warm_up = {'pid': None, 'ready': False, 'error': None, 'seconds': None}
+_warm_up_lock = threading.Lock()
+# A failed warm-up is retried after this many seconds, doubled up to the maximum
+WARM_UP_RETRY_DELAY = 1.0
+WARM_UP_RETRY_MAX = 60.0
+
+def warm_up(level):
+    start = time.perf_counter()
+    delay = WARM_UP_RETRY_DELAY
+    # With SHARED_DATASET_PATH on persistent storage a restart maps the Arrow file written
+    # at the last load instead of parsing candidatura.json again. The data may also show up
+    # after the process started, so a failure is not final
+    while load_candidature() is None or load_candidatura() is None:
+        _warm_up['error'] = 'Data loading failed'
+        app.logger.error(f"Warm-up failed, retrying in {delay} s")
+        time.sleep(delay)
+        delay = min(delay * 2, WARM_UP_RETRY_MAX)
+    _warm_up['seconds'] = round(time.perf_counter() - start, 3)
+    _warm_up['error'] = None
+    _warm_up['ready'] = True
+    WARM_UP_DURATION.set(_warm_up['seconds'])
+    READY.set(1)
+    app.logger.info(f"Dataset ready in {_warm_up['seconds']} s")
+
+    if level == 'all':
+        load_matrix()
+        load_bitmap_index()
+
+def start_warm_up():
+    level = os.getenv('WARM_UP', '1')
+    if level == '0':
+        _warm_up['ready'] = True
+        READY.set(1)
+        return
+    threading.Thread(target=warm_up, args=(level,), name='warm-up', daemon=True).start()
+
+@app.before_request
+def ensure_warm_up():
+    # Started at import and again in every forked worker (see below), checked once more by
+    # each request in case a process was created some other way
+    if _warm_up['pid'] == os.getpid():
+        return
+    with _warm_up_lock:
+        if _warm_up['pid'] != os.getpid():
+            _warm_up.update(pid=os.getpid(), ready=False, error=None, seconds=None)
+            READY.set(0)
+            start_warm_up()
+
+def _warm_up_after_fork():
+    global _warm_up_lock
+    # A worker forked from a server that preloaded the app inherits the master's state but not
+    # its warm-up thread: it starts its own at once, before any request reaches it
+    _warm_up_lock = threading.Lock()
+    ensure_warm_up()
+
+ensure_warm_up()
+os.register_at_fork(after_in_child=_warm_up_after_fork)
+
 if __name__ == '__main__':
     app.run(debug=True)
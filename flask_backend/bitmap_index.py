@@ -0,0 +1,163 @@
+import threading
+import numpy as np
+import pandas as pd
+
+# Number of set bits of every byte value, to count a bitmap without unpacking it
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+class QueryError(ValueError):
+    pass
+
+def _words_for(n_rows):
+    return np.zeros((n_rows + 63) // 64, dtype=np.uint64)
+
+def _rows_to_words(rows, n_rows):
+    bits = np.zeros(len(_words_for(n_rows)) * 64, dtype=bool)
+    bits[rows] = True
+    return np.packbits(bits, bitorder='little').view(np.uint64)
+
+def _words_to_rows(words, n_rows):
+    bits = np.unpackbits(words.view(np.uint8), bitorder='little', count=n_rows)
+    return np.flatnonzero(bits)
+
+def _resize(words, n_rows):
+    if len(words) == len(_words_for(n_rows)):
+        return words
+    resized = _words_for(n_rows)
+    resized[:len(words)] = words
+    return resized
+
+def _is_str_list(values):
+    return isinstance(values, list) and all(isinstance(value, str) for value in values)
+
+# One immutable version of the index; updates build a new one and swap it in
+class _Version:
+    def __init__(self, ids, row_index, codes, values, bitmaps, live):
+        self.ids = ids
+        self.row_index = row_index
+        self.codes = codes
+        self.values = values
+        self.bitmaps = bitmaps
+        self.live = live
+
+    @property
+    def n_rows(self):
+        return len(self.ids)
+
+    def words(self, bitmap):
+        if bitmap.dtype == np.uint32:
+            return _rows_to_words(bitmap, self.n_rows)
+        return _resize(bitmap, self.n_rows)
+
+    def store(self, words):
+        # An array of uint32 rows is smaller than the bitset below 1 set bit every 32 rows
+        count = int(_POPCOUNT[words.view(np.uint8)].sum())
+        if count * 32 < self.n_rows:
+            return _words_to_rows(words, self.n_rows).astype(np.uint32)
+        return words
+
+# Bitmap index over candidatura row numbers, one bitmap per (documentClass or nomeCheck, status).
+# Sparse bitmaps are kept as sorted row arrays and dense ones as 64-bit words, like roaring
+# containers, and queries combine them as words with numpy bitwise operations.
+class BitmapIndex:
+    def __init__(self):
+        self.version = _Version(np.array([], dtype=object), pd.Index([], dtype=object), {}, {}, {}, _words_for(0))
+        self._lock = threading.Lock()
+
+    def update(self, snapshot):
+        # snapshot: DataFrame of (candidatureId, check, status) rows for the whole dataset
+        with self._lock:
+            old = self.version
+            ids, row_index = old.ids, old.row_index
+            unique_ids = pd.unique(snapshot['candidatureId'])
+            new_ids = unique_ids[row_index.get_indexer(unique_ids) < 0]
+            if len(new_ids):
+                # Existing candidature keep their row number, new ones are appended
+                ids = np.concatenate([ids, np.asarray(new_ids, dtype=object)])
+                row_index = pd.Index(ids)
+            rows = row_index.get_indexer(snapshot['candidatureId'])
+            # Candidature dropped from the dataset keep their row, outside the live rows
+            new = _Version(ids, row_index, {}, {}, dict(old.bitmaps), _rows_to_words(np.unique(rows), len(ids)))
+            n_rows = new.n_rows
+
+            groups = snapshot.groupby('check', sort=False).indices
+            for field in list(groups) + [field for field in old.codes if field not in groups]:
+                values = dict(old.values.get(field, {}))
+                new_codes = np.full(n_rows, -1, dtype=np.int32)
+                if field in groups:
+                    positions = groups[field]
+                    statuses = snapshot['status'].to_numpy()[positions]
+                    for status in pd.unique(statuses):
+                        values.setdefault(status, len(values))
+                    new_codes[rows[positions]] = pd.Series(statuses).map(values).to_numpy()
+
+                old_codes = np.full(n_rows, -1, dtype=np.int32)
+                if field in old.codes:
+                    old_codes[:old.n_rows] = old.codes[field]
+
+                # Only the bitmaps of values whose rows changed are touched
+                changed = np.flatnonzero(old_codes != new_codes)
+                for code in np.union1d(old_codes[changed], new_codes[changed]):
+                    if code < 0:
+                        continue
+                    key = (field, int(code))
+                    words = new.words(new.bitmaps[key]).copy() if key in new.bitmaps else _words_for(n_rows)
+                    words &= ~_rows_to_words(changed[old_codes[changed] == code], n_rows)
+                    words |= _rows_to_words(changed[new_codes[changed] == code], n_rows)
+                    new.bitmaps[key] = new.store(words)
+                new.codes[field] = new_codes
+                new.values[field] = values
+
+            self.version = new
+
+    def keys(self):
+        return {field: sorted(values) for field, values in self.version.values.items()}
+
+    def _leaf(self, version, field, value):
+        code = version.values.get(field, {}).get(value)
+        if code is None or (field, code) not in version.bitmaps:
+            return _words_for(version.n_rows)
+        return version.words(version.bitmaps[(field, code)])
+
+    def _evaluate(self, version, query):
+        if not isinstance(query, dict):
+            raise QueryError(f"Invalid query node: {query}")
+        if 'and' in query or 'or' in query:
+            operator = 'and' if 'and' in query else 'or'
+            operands = query[operator]
+            if not isinstance(operands, list) or not operands:
+                raise QueryError(f"'{operator}' needs a non-empty list")
+            result = self._evaluate(version, operands[0]).copy()
+            for operand in operands[1:]:
+                if operator == 'and':
+                    result &= self._evaluate(version, operand)
+                else:
+                    result |= self._evaluate(version, operand)
+            return result
+        if 'not' in query:
+            return ~self._evaluate(version, query['not']) & version.live
+        if 'any' in query:
+            # The status in any of the given fields, all of them by default
+            fields = query.get('fields')
+            if not isinstance(query['any'], str) or not (fields is None or _is_str_list(fields)):
+                raise QueryError("'any' needs a status and optionally a list of 'fields'")
+            result = _words_for(version.n_rows)
+            for field in fields or version.values:
+                result |= self._leaf(version, field, query['any'])
+            return result
+        if 'field' in query and 'value' in query:
+            values = query['value'] if isinstance(query['value'], list) else [query['value']]
+            if not isinstance(query['field'], str) or not _is_str_list(values):
+                raise QueryError("'field' needs a name and 'value' a status or a list of statuses")
+            result = _words_for(version.n_rows)
+            for value in values:
+                result |= self._leaf(version, query['field'], value)
+            return result
+        raise QueryError(f"Invalid query node: {query}")
+
+    def query(self, query, offset=0, limit=100):
+        version = self.version
+        words = self._evaluate(version, query) & version.live
+        count = int(_POPCOUNT[words.view(np.uint8)].sum())
+        rows = _words_to_rows(words, version.n_rows)[offset:offset + limit]
+        return {'count': count, 'candidature_ids': version.ids[rows].tolist()}
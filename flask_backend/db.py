@@ -1,8 +1,9 @@
-from pymongo import MongoClient
 from flask import current_app, g
 
 def get_db():
     if 'mongo_db' not in g:
+        # pymongo is imported on first use, the JSON backend never connects to MongoDB
+        from pymongo import MongoClient
         g.mongo_db = MongoClient(current_app.config['MONGO_URI']).get_database()
     return g.mongo_db
 
@@ -0,0 +1,118 @@
+import io
+import csv
+import tempfile
+
+# format: (mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+# Rows encoded per chunk of the response body (and per Parquet row group)
+CHUNK_ROWS = 10000
+# The XLSX is spooled in memory up to this size, then to a temporary file
+XLSX_SPOOL_SIZE = 16 * 2**20
+READ_SIZE = 2**20
+
+# Document fields read to build a row
+DOCUMENT_FIELDS = ['documentClass', 'esitoCheckReason', 'dettaglioCheck']
+
+def export_columns(document_classes, checks):
+    return ['candidatureId'] + list(document_classes) + list(checks)
+
+def iter_rows(candidature_ids, candidatura, document_classes, checks):
+    # One row per candidatura: the status of each document, then the outcome of each check.
+    # Documents are fetched a chunk of candidature at a time
+    for chunk in iter_chunks(candidature_ids):
+        for candidatura_id, documents in zip(chunk, candidatura.get_many(chunk, columns=DOCUMENT_FIELDS)):
+            statuses = {doc['documentClass']: doc['esitoCheckReason'] for doc in documents}
+            details = {check['nomeCheck']: check['Descrizione'] for doc in documents for check in doc['dettaglioCheck']}
+            yield ([candidatura_id]
+                   + [statuses.get(document_class, '') for document_class in document_classes]
+                   + [details.get(check, '') for check in checks])
+
+def iter_chunks(rows, size=CHUNK_ROWS):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def stream_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    # The header goes out before the first row is read, so the download starts at once
+    yield buffer.getvalue().encode('utf-8')
+    for chunk in iter_chunks(rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode('utf-8')
+
+def stream_xlsx(columns, rows):
+    # openpyxl and pyarrow are imported by the format that needs them, not at app startup
+    from openpyxl import Workbook
+    # Write-only worksheets keep no cell objects; the zip is only complete after save,
+    # so it is built in a spooled file and then sent in blocks
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Controlli')
+    worksheet.append(columns)
+    for row in rows:
+        worksheet.append(row)
+
+    with tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_SIZE) as spool:
+        workbook.save(spool)
+        spool.seek(0)
+        for block in iter(lambda: spool.read(READ_SIZE), b''):
+            yield block
+
+# Write-only file object that hands over what the Parquet writer has written so far
+class ChunkSink:
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def stream_parquet(columns, rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for chunk in iter_chunks(rows):
+            arrays = [pa.array(values, type=pa.string()) for values in zip(*chunk)]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            yield sink.drain()
+    # Footer
+    yield sink.drain()
+
+STREAMS = {'csv': stream_csv, 'xlsx': stream_xlsx, 'parquet': stream_parquet}
+
+def stream_export(export_format, candidature_ids, candidatura, document_classes, checks):
+    rows = iter_rows(candidature_ids, candidatura, document_classes, checks)
+    return STREAMS[export_format](export_columns(document_classes, checks), rows)
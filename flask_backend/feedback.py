@@ -0,0 +1,192 @@
+import os
+import glob
+import json
+import logging
+import time
+import fcntl
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from store import connect, upsert_feedback, load_feedback, FEEDBACK_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Edits waiting at most this long are written and fsynced together
+GROUP_COMMIT_DELAY = 0.005
+GROUP_COMMIT_MAX_BATCH = 500
+# Entries whose upsert failed are retried this often, even if no new edit arrives
+COMMIT_RETRY_INTERVAL = 1.0
+
+def commit_entries(conn, entries):
+    # The whole batch in one transaction; if the store rejects it, entry by entry, so that an
+    # entry it can never take (a value it cannot bind) is dropped instead of blocking the others.
+    # Returns the entries to retry, those that failed on a busy or locked store
+    try:
+        upsert_feedback(conn, entries)
+        return []
+    except sqlite3.OperationalError as e:
+        logger.error(f"Error committing feedback to the store: {e}")
+        return entries
+    except Exception:
+        pass
+
+    retry = []
+    for entry in entries:
+        try:
+            upsert_feedback(conn, [entry])
+        except sqlite3.OperationalError as e:
+            logger.error(f"Error committing feedback to the store: {e}")
+            retry.append(entry)
+        except Exception as e:
+            logger.error(f"Dropping feedback entry rejected by the store: {entry}: {e}")
+    return retry
+
+def replay_orphan_logs(log_dir, conn):
+    # Logs of workers that died before committing to the store; live workers hold a lock on theirs
+    for path in sorted(glob.glob(os.path.join(log_dir, 'feedback-*.log'))):
+        with open(path, 'r+') as log_file:
+            try:
+                fcntl.flock(log_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            entries = [json.loads(line) for line in log_file if line.endswith('\n')]
+            if entries and commit_entries(conn, entries):
+                # Store busy: the log stays for the next worker to replay
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another worker replayed it first, upserts are idempotent
+                pass
+
+class FeedbackWriter:
+    def __init__(self, log_dir, store_path=None):
+        os.makedirs(log_dir, exist_ok=True)
+        self.store_path = store_path
+        conn = connect(store_path)
+        try:
+            replay_orphan_logs(log_dir, conn)
+        finally:
+            conn.close()
+
+        # Lock before the file gets a name that replay_orphan_logs would pick up
+        self.pid = os.getpid()
+        log_path = os.path.join(log_dir, f'feedback-{self.pid}.log')
+        self.log_file = open(f'{log_path}.new', 'a')
+        fcntl.flock(self.log_file, fcntl.LOCK_EX)
+        os.replace(f'{log_path}.new', log_path)
+        self.uncommitted = []
+
+        # Edits already durable in the log but not yet in the store, visible to the read path
+        self.overlay = {}
+        self.overlay_lock = threading.Lock()
+        self.queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, candidature_id, document_class, user_feedback, username, timeout=10):
+        entry = {
+            'candidatureId': candidature_id,
+            'documentClass': document_class,
+            'userFeedback': user_feedback,
+            'lastmodifyUsers': username,
+            # Fixed precision, so that timestamps compare correctly as strings
+            'modifyTimestamp': datetime.now(timezone.utc).isoformat(timespec='microseconds'),
+        }
+        future = Future()
+        self.queue.put((entry, future))
+        # Returns once the entry is fsynced in the log
+        return future.result(timeout)
+
+    def pending(self, candidature_id):
+        with self.overlay_lock:
+            return {key[1]: entry for key, entry in self.overlay.items() if key[0] == candidature_id}
+
+    def _next_batch(self):
+        # With entries left to commit, wake up to retry them instead of waiting for the next edit
+        try:
+            batch = [self.queue.get(timeout=COMMIT_RETRY_INTERVAL if self.uncommitted else None)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + GROUP_COMMIT_DELAY
+        while len(batch) < GROUP_COMMIT_MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        # SQLite connections belong to the thread that opened them
+        conn = connect(self.store_path)
+        while True:
+            batch = self._next_batch()
+            entries = [entry for entry, _ in batch]
+            if entries:
+                try:
+                    self.log_file.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+                    self.log_file.flush()
+                    os.fsync(self.log_file.fileno())
+                except Exception as e:
+                    logger.error(f"Error writing feedback log: {e}")
+                    for _, future in batch:
+                        future.set_exception(e)
+                    continue
+
+                with self.overlay_lock:
+                    for entry in entries:
+                        self.overlay[(entry['candidatureId'], entry['documentClass'])] = entry
+                for entry, future in batch:
+                    future.set_result(entry)
+
+            to_commit = self.uncommitted + entries
+            if not to_commit:
+                continue
+            # Entries left to retry stay in the log and in the overlay until a retry succeeds
+            self.uncommitted = commit_entries(conn, to_commit)
+            retry = {id(entry) for entry in self.uncommitted}
+
+            # Entries committed or dropped leave the overlay
+            with self.overlay_lock:
+                for entry in to_commit:
+                    key = (entry['candidatureId'], entry['documentClass'])
+                    if id(entry) not in retry and self.overlay.get(key) is entry:
+                        del self.overlay[key]
+            # Everything logged so far is in the store: the log can go
+            if not self.uncommitted:
+                self.log_file.truncate(0)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_feedback_writer():
+    global _writer
+    with _writer_lock:
+        # A forked worker must not share the parent's log file and thread
+        if _writer is None or _writer.pid != os.getpid():
+            _writer = FeedbackWriter(os.getenv('FEEDBACK_LOG_DIR', 'feedback_log'))
+        return _writer
+
+def apply_feedback(documents, conn, writer):
+    if not documents:
+        return documents
+    candidature_id = documents[0]['candidatureId']
+    feedback = load_feedback(conn, candidature_id)
+    # An overlay entry only wins if it is not older than what another worker already stored
+    for document_class, entry in writer.pending(candidature_id).items():
+        stored = feedback.get(document_class)
+        if stored is None or entry['modifyTimestamp'] >= stored['modifyTimestamp']:
+            feedback[document_class] = entry
+    if not feedback:
+        return documents
+
+    # Copies, so the cached dataset is never mutated by the overlay
+    return [
+        {**doc, **{field: feedback[doc['documentClass']][field] for field in FEEDBACK_FIELDS}}
+        if doc['documentClass'] in feedback else doc
+        for doc in documents
+    ]
@@ -0,0 +1,102 @@
+import os
+import re
+import sys
+import json
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# One Parquet file per control run, partitioned as <HISTORY_PATH>/run_date=YYYYMMDD/
+PARTITION = 'run_date={}'
+SNAPSHOT_FILE = 'snapshot.parquet'
+KEYS = ['candidatureId', 'check']
+
+def history_path():
+    return os.getenv('HISTORY_PATH', 'history')
+
+def snapshot_from_table(table):
+    # Document statuses plus the checks of every document, as (candidatureId, check, status) rows
+    documents = pa.table({
+        'candidatureId': table.column('candidatureId'),
+        'check': table.column('documentClass'),
+        'status': table.column('esitoCheckReason'),
+    })
+    dettaglio = table.column('dettaglioCheck').combine_chunks()
+    flat = pc.list_flatten(dettaglio)
+    parents = pc.list_parent_indices(dettaglio)
+    checks = pa.table({
+        'candidatureId': pc.take(table.column('candidatureId'), parents),
+        'check': flat.field('nomeCheck'),
+        'status': flat.field('Descrizione'),
+    })
+    snapshot = pa.concat_tables([documents, checks.cast(documents.schema)])
+    # Sorted keys give tight row group statistics for the filtered reads of diff_snapshots
+    return snapshot.sort_by([('candidatureId', 'ascending'), ('check', 'ascending')])
+
+def write_snapshot(snapshot, run_date, path=None):
+    if not isinstance(run_date, str) or not re.fullmatch(r'\d{8}', run_date):
+        raise ValueError(f"run_date must be YYYYMMDD, got {run_date}")
+    partition = os.path.join(path or history_path(), PARTITION.format(run_date))
+    os.makedirs(partition, exist_ok=True)
+
+    # Written aside and renamed, so a diff never reads a half-written snapshot
+    tmp_path = os.path.join(partition, f'.{SNAPSHOT_FILE}.{os.getpid()}.tmp')
+    pq.write_table(snapshot, tmp_path, row_group_size=1 << 20, use_dictionary=True, compression='zstd')
+    os.replace(tmp_path, os.path.join(partition, SNAPSHOT_FILE))
+    return snapshot.num_rows
+
+def list_runs(path=None):
+    path = path or history_path()
+    if not os.path.isdir(path):
+        return []
+    runs = []
+    for name in os.listdir(path):
+        match = re.fullmatch(PARTITION.format(r'(\d{8})'), name)
+        if match and os.path.exists(os.path.join(path, name, SNAPSHOT_FILE)):
+            runs.append(match.group(1))
+    return sorted(runs)
+
+def read_snapshot(run_date, status=None, check=None, path=None):
+    filters = []
+    if status is not None:
+        filters.append(('status', '=', status))
+    if check is not None:
+        filters.append(('check', '=', check))
+    snapshot_path = os.path.join(path or history_path(), PARTITION.format(run_date), SNAPSHOT_FILE)
+    # Only this run's partition is opened; filters skip row groups and rows before they reach Python
+    return pq.read_table(snapshot_path, columns=KEYS + ['status'], filters=filters or None)
+
+def diff_snapshots(run_from, run_to, status_from=None, status_to=None, check=None, offset=0, limit=100, path=None):
+    before = read_snapshot(run_from, status_from, check, path).rename_columns(KEYS + ['status_from'])
+    after = read_snapshot(run_to, status_to, check, path).rename_columns(KEYS + ['status_to'])
+
+    # With a status filter on one side, rows missing on the other side are not transitions
+    if status_from is not None and status_to is not None:
+        join_type = 'inner'
+    elif status_from is not None:
+        join_type = 'left outer'
+    elif status_to is not None:
+        join_type = 'right outer'
+    else:
+        join_type = 'full outer'
+    joined = before.join(after, keys=KEYS, join_type=join_type)
+
+    changed = pc.invert(pc.fill_null(pc.equal(joined.column('status_from'), joined.column('status_to')), False))
+    changes = joined.filter(changed).sort_by([('candidatureId', 'ascending'), ('check', 'ascending')])
+
+    transitions = changes.group_by(['check', 'status_from', 'status_to']).aggregate([('candidatureId', 'count')])
+    transitions = transitions.rename_columns(['check', 'status_from', 'status_to', 'count'])
+    return {
+        'from': run_from,
+        'to': run_to,
+        'total': changes.num_rows,
+        'transitions': sorted(transitions.to_pylist(), key=lambda row: -row['count']),
+        'changes': changes.slice(offset, limit).to_pylist(),
+    }
+
+if __name__ == '__main__':
+    # python history.py <candidatura.json> <YYYYMMDD>: record the snapshot of a control run
+    with open(sys.argv[1], 'rb') as json_file:
+        documents = json.load(json_file)
+    rows = write_snapshot(snapshot_from_table(pa.Table.from_pylist(documents)), sys.argv[2])
+    print(f"Snapshot {sys.argv[2]} written with {rows} rows")
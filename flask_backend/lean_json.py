@@ -0,0 +1,172 @@
+import os
+import re
+import sys
+import json
+import pyarrow.parquet as pq
+
+DOCUMENT_FIELDS = (
+    'candidatureId', 'documentClass', 'documentID', 'modifyTimestamp', 'documentType', 'esitoChecks',
+    'esitoCheckReason', 'dettaglioCheck', 'documentName', 'userFeedback', 'lastmodifyUsers',
+)
+
+# Compact document record. It behaves as a read-only mapping, so doc['documentClass'],
+# {**doc} and dict(doc) keep working where the plain json.load dicts were used.
+class Document:
+    __slots__ = DOCUMENT_FIELDS + ('extra',)
+
+    def __init__(self, candidatureId, documentClass, documentID, modifyTimestamp, documentType, esitoChecks,
+                 esitoCheckReason, dettaglioCheck, documentName, userFeedback, lastmodifyUsers, extra=None):
+        self.candidatureId = candidatureId
+        self.documentClass = documentClass
+        self.documentID = documentID
+        self.modifyTimestamp = modifyTimestamp
+        self.documentType = documentType
+        self.esitoChecks = esitoChecks
+        self.esitoCheckReason = esitoCheckReason
+        self.dettaglioCheck = dettaglioCheck
+        self.documentName = documentName
+        self.userFeedback = userFeedback
+        self.lastmodifyUsers = lastmodifyUsers
+        self.extra = extra
+
+    def keys(self):
+        if self.extra:
+            return DOCUMENT_FIELDS + tuple(self.extra)
+        return DOCUMENT_FIELDS
+
+    def __getitem__(self, key):
+        if key in DOCUMENT_FIELDS:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+# Whitespace before the array, whitespace and commas between its elements
+_LEADING = re.compile(r'\s*')
+_SEPARATOR = re.compile(r'[\s,]*')
+
+def iter_json_array(path, chunk_size=1 << 20):
+    # Decode one element of the top-level array at a time instead of the whole file
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as json_file:
+        buffer = json_file.read(chunk_size)
+        eof = not buffer
+        pos = 0
+        started = False
+        while True:
+            pos = (_SEPARATOR if started else _LEADING).match(buffer, pos).end()
+            if pos < len(buffer):
+                if not started:
+                    if buffer[pos] != '[':
+                        raise ValueError(f"{path} does not contain a JSON array")
+                    started = True
+                    pos += 1
+                    continue
+                if buffer[pos] == ']':
+                    return
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    # A value ending on the buffer boundary may be truncated (e.g. a number)
+                    if end < len(buffer) or eof:
+                        yield value
+                        pos = end
+                        continue
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+            elif eof:
+                raise ValueError(f"{path} ends before the JSON array is closed")
+
+            chunk = json_file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+class Interner:
+    def __init__(self):
+        self.checks = {}
+        self.check_lists = {}
+
+    def string(self, value):
+        return sys.intern(value) if type(value) is str else value
+
+    def check_list(self, checks):
+        # A dataset has few distinct checks and dettaglioCheck lists: every document shares
+        # the same dicts and tuples, the empty list included
+        key = tuple(tuple(check.items()) for check in checks)
+        shared = self.check_lists.get(key)
+        if shared is None:
+            shared = self.check_lists[key] = tuple(self.check(items) for items in key)
+        return shared
+
+    def check(self, items):
+        shared = self.checks.get(items)
+        if shared is None:
+            shared = self.checks[items] = {self.string(name): self.string(value) for name, value in items}
+        return shared
+
+    def document(self, raw):
+        string = self.string
+        document = Document(
+            string(raw.pop('candidatureId', '')), string(raw.pop('documentClass', '')),
+            string(raw.pop('documentID', '')), string(raw.pop('modifyTimestamp', '')),
+            string(raw.pop('documentType', '')), raw.pop('esitoChecks', ''),
+            string(raw.pop('esitoCheckReason', '')), self.check_list(raw.pop('dettaglioCheck', ())),
+            string(raw.pop('documentName', '')), string(raw.pop('userFeedback', '')),
+            string(raw.pop('lastmodifyUsers', '')),
+        )
+        if raw:
+            document.extra = {string(key): string(value) for key, value in raw.items()}
+        return document
+
+# Sharded datasets written by create_json_candidature.py --shards are read through their manifest
+MANIFEST_SUFFIX = '.manifest.json'
+
+def is_manifest(path):
+    return path.endswith(MANIFEST_SUFFIX)
+
+def iter_part(path, part_format):
+    if part_format == 'json':
+        yield from iter_json_array(path)
+    elif part_format == 'ndjson':
+        with open(path, 'r', encoding='utf-8') as part_file:
+            for line in part_file:
+                if line.strip():
+                    yield json.loads(line)
+    elif part_format == 'parquet':
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+    else:
+        raise ValueError(f"Unknown part format: {part_format}")
+
+def iter_manifest(path):
+    with open(path, 'r', encoding='utf-8') as manifest_file:
+        manifest = json.load(manifest_file)
+    base_dir = os.path.dirname(path)
+    for part in manifest['parts']:
+        count = 0
+        for document in iter_part(os.path.join(base_dir, part['path']), manifest['format']):
+            count += 1
+            yield document
+        if count != part['documents']:
+            raise ValueError(f"{part['path']}: {count} documents, {part['documents']} in the manifest")
+
+def iter_raw_documents(path):
+    return iter_manifest(path) if is_manifest(path) else iter_json_array(path)
+
+def iter_documents(path, interner=None):
+    interner = interner or Interner()
+    for raw in iter_raw_documents(path):
+        yield interner.document(raw)
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+# Candidature x documentClass status matrix, paged, sorted and filtered on the backend
+class StatusMatrix:
+    def __init__(self, documents):
+        df = pd.DataFrame(documents, columns=['candidatureId', 'documentClass', 'esitoCheckReason'])
+        df = df.drop_duplicates(['candidatureId', 'documentClass'], keep='last')
+        matrix = df.pivot(index='candidatureId', columns='documentClass', values='esitoCheckReason')
+        # Categoricals keep one copy of each status string and make sorting an integer argsort
+        self.frame = matrix.fillna('').astype('category')
+        self.ids = self.frame.index.to_numpy()
+        self.columns = self.frame.columns.tolist()
+        self._orders = {}
+
+    def _order(self, column, ascending):
+        key = (column, ascending)
+        if key not in self._orders:
+            if column == 'candidatureId':
+                order = np.arange(len(self.ids))
+            else:
+                values = self.frame[column].cat.reorder_categories(sorted(self.frame[column].cat.categories))
+                order = np.argsort(values.cat.codes.to_numpy(), kind='stable')
+            self._orders[key] = order if ascending else order[::-1]
+        return self._orders[key]
+
+    def select(self, sort=None, ascending=True, filters=None, prefix=None):
+        # Row positions matching the filters, in display order
+        mask = np.ones(len(self.ids), dtype=bool)
+        for column, values in (filters or {}).items():
+            mask &= self.frame[column].isin(values).to_numpy()
+        if prefix:
+            mask &= pd.Series(self.ids).str.startswith(prefix).to_numpy()
+
+        order = self._order(sort or 'candidatureId', ascending)
+        return order[mask[order]]
+
+    def page(self, offset=0, limit=100, sort=None, ascending=True, filters=None, prefix=None):
+        selected = self.select(sort, ascending, filters, prefix)
+        rows = selected[offset:offset + limit]
+
+        page = self.frame.iloc[rows].astype(object).reset_index()
+        return {
+            'columns': ['candidatureId'] + self.columns,
+            'rows': page.to_dict(orient='records'),
+            'total': int(len(selected)),
+        }
@@ -0,0 +1,161 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import Response, g, has_request_context, request
+from storage import add_listener
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 10240, 102400, 1048576, 10485760, 104857600)
+
+# Imported before the routes and data modules, as the reference for the first useful response
+PROCESS_START = time.time()
+
+# Requests carrying this header get a Server-Timing header with the phase breakdown
+SERVER_TIMING_HEADER = 'X-Server-Timing'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    labels = list(labels)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(zip(self.labelnames, key))} {value}')
+        return lines
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f'# TYPE {self.name} gauge'
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            # The last slot counts observations above the largest bucket
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, list(counts), total) for key, (counts, total) in self._values.items())
+        for key, counts, total in items:
+            labels = list(zip(self.labelnames, key))
+            # Buckets are stored non-cumulative so that observe stays a single increment
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {cumulative}')
+        return lines
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Latenza delle richieste HTTP', ('endpoint', 'method', 'status'))
+RESPONSE_SIZE = Histogram('http_response_size_bytes', 'Dimensione del payload di risposta', ('endpoint',), SIZE_BUCKETS)
+PHASE_LATENCY = Histogram('phase_duration_seconds', 'Tempo speso nelle fasi load, parse, index e serialize', ('phase',))
+CACHE_REQUESTS = Counter('cache_requests_total', 'Accessi alla cache per esito', ('cache', 'result'))
+READY = Gauge('ready', 'Dataset caricato e backend pronto (1) o in riscaldamento (0)')
+WARM_UP_DURATION = Gauge('warm_up_duration_seconds', 'Tempo di caricamento del dataset all\'avvio')
+FIRST_RESPONSE = Gauge('first_response_seconds', 'Tempo dall\'avvio del processo alla prima risposta con dati')
+SINGLE_FLIGHT_CALLS = Counter('single_flight_calls_total', 'Richieste di caricamento per esito: load, wait (in attesa del caricamento in corso) o stale (versione precedente)', ('loader', 'result'))
+SINGLE_FLIGHT_WAITING = Gauge('single_flight_waiting', 'Richieste in attesa di un caricamento in corso', ('loader',))
+STORAGE_BYTES = Counter('storage_bytes_total', 'Byte degli input su S3 scaricati (fetched) o letti dalla cache locale (cached)', ('kind',))
+SINGLE_FLIGHT_WAIT = Histogram('single_flight_wait_seconds', 'Attesa delle richieste accodate a un caricamento in corso', ('loader',))
+
+REGISTRY = [
+    REQUEST_LATENCY, RESPONSE_SIZE, PHASE_LATENCY, CACHE_REQUESTS, READY, WARM_UP_DURATION, FIRST_RESPONSE,
+    SINGLE_FLIGHT_CALLS, SINGLE_FLIGHT_WAITING, SINGLE_FLIGHT_WAIT, STORAGE_BYTES,
+]
+
+# Endpoints that do not serve data and do not count as the first useful response
+PROBE_ENDPOINTS = ('/metrics', '/healthz', '/readyz')
+_first_response = threading.Event()
+
+@contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        PHASE_LATENCY.observe(elapsed, phase=name)
+        if has_request_context() and 'phases' in g:
+            g.phases.append((name, elapsed))
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+def init_metrics(app):
+    add_listener(lambda kind, nbytes: STORAGE_BYTES.inc(nbytes, kind=kind))
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+        g.phases = []
+
+    @app.after_request
+    def record_request(response):
+        if 'request_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_start
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'not_found'
+        REQUEST_LATENCY.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+        if response.content_length is not None:
+            RESPONSE_SIZE.observe(response.content_length, endpoint=endpoint)
+        if not _first_response.is_set() and response.status_code == 200 and endpoint not in PROBE_ENDPOINTS:
+            _first_response.set()
+            FIRST_RESPONSE.set(round(time.time() - PROCESS_START, 3))
+
+        if request.headers.get(SERVER_TIMING_HEADER):
+            timings = [f'{name};dur={duration * 1000:.2f}' for name, duration in g.phases]
+            timings.append(f'total;dur={elapsed * 1000:.2f}')
+            response.headers['Server-Timing'] = ', '.join(timings)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    return app
@@ -0,0 +1,142 @@
+import os
+import json
+import fcntl
+import hashlib
+import threading
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from metrics import phase, record_cache
+from lean_json import is_manifest, iter_manifest
+from single_flight import SingleFlight, stale_while_revalidate
+
+# Schema metadata key holding the source file the shared table was built from
+VERSION_KEY = b'source_version'
+
+# Read-only view over a memory-mapped Arrow IPC file sorted by candidatureId.
+# The table pages are shared by every process mapping the same file, so each
+# worker only keeps the run boundaries of the candidatureId column.
+class SharedDataset:
+    def __init__(self, path):
+        self.path = path
+        stat = os.stat(path)
+        self.file_key = (stat.st_ino, stat.st_mtime_ns)
+        with phase('load'):
+            source = pa.memory_map(path, 'r')
+            self.table = pa.ipc.open_file(source).read_all()
+        self.version = (self.table.schema.metadata or {}).get(VERSION_KEY, b'').decode()
+        with phase('index'):
+            runs = pc.run_end_encode(self.table.column('candidatureId').combine_chunks())
+        self.run_values = runs.values
+        self.run_ends = runs.run_ends.to_numpy()
+
+    def _find_run(self, candidature_id):
+        # Binary search over the sorted run values, without materialising them in Python
+        low, high = 0, len(self.run_values)
+        while low < high:
+            middle = (low + high) // 2
+            if self.run_values[middle].as_py() < candidature_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.run_values) and self.run_values[low].as_py() == candidature_id:
+            return low
+        return None
+
+    def get(self, candidature_id, default=None):
+        run = self._find_run(candidature_id)
+        if run is None:
+            return default
+        start = int(self.run_ends[run - 1]) if run > 0 else 0
+        return self.table.slice(start, int(self.run_ends[run]) - start).to_pylist()
+
+    def get_many(self, candidature_ids, columns=None):
+        # Documents of many candidature, in the order of the IDs, with a single take.
+        # columns limits the fields converted to Python objects
+        runs = pc.index_in(pa.array(candidature_ids, type=self.run_values.type), value_set=self.run_values)
+        runs = pc.fill_null(runs, -1).to_numpy()
+        found = runs >= 0
+        ends = np.where(found, self.run_ends[runs], 0)
+        starts = np.where(found & (runs > 0), self.run_ends[runs - 1], 0)
+        lengths = ends - starts
+        offsets = np.cumsum(lengths)
+        indices = np.repeat(starts - offsets + lengths, lengths) + np.arange(offsets[-1] if len(offsets) else 0)
+        table = self.table.select(columns) if columns else self.table
+        rows = table.take(indices).to_pylist()
+        return [rows[offset - length:offset] for offset, length in zip(offsets.tolist(), lengths.tolist())]
+
+def source_version(source_path):
+    return f'{os.path.abspath(source_path)}:{os.stat(source_path).st_mtime_ns}'
+
+def version_token(version):
+    # What clients see of a version: opaque, since source_version() holds the server's data path
+    return hashlib.sha256(version.encode('utf-8')).hexdigest()[:16]
+
+def read_version(shared_path):
+    try:
+        with pa.memory_map(shared_path, 'r') as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+        return metadata.get(VERSION_KEY, b'').decode()
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+
+def publish(documents, shared_path, version):
+    with phase('index'):
+        table = pa.Table.from_pylist(documents)
+        table = table.take(pc.sort_indices(table, sort_keys=[('candidatureId', 'ascending')]))
+        table = table.replace_schema_metadata({VERSION_KEY: version.encode()})
+
+    # Write next to the target and rename, so attached readers keep their old mapping
+    tmp_path = f'{shared_path}.{os.getpid()}.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, shared_path)
+
+def load_documents(source_path):
+    if is_manifest(source_path):
+        with phase('parse'):
+            return list(iter_manifest(source_path))
+    with phase('load'):
+        with open(source_path, 'rb') as json_file:
+            raw = json_file.read()
+    with phase('parse'):
+        return json.loads(raw)
+
+_attached = None
+_attach_lock = threading.Lock()
+_refreshes = SingleFlight('candidatura_shared')
+
+def ensure_published(source_path, shared_path, version):
+    if read_version(shared_path) == version:
+        return
+
+    # Only one process rebuilds the shared file, the others wait and attach to it
+    with open(f'{shared_path}.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if read_version(shared_path) != version:
+                publish(load_documents(source_path), shared_path, version)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def get_shared_dataset(source_path, shared_path):
+    version = source_version(source_path)
+    attached = _attached
+    if attached is not None and attached.version == version:
+        record_cache('candidatura_shared', True)
+        return attached
+    record_cache('candidatura_shared', False)
+
+    def refresh():
+        global _attached
+        ensure_published(source_path, shared_path, version)
+        with _attach_lock:
+            stat = os.stat(shared_path)
+            if _attached is None or _attached.file_key != (stat.st_ino, stat.st_mtime_ns):
+                _attached = SharedDataset(shared_path)
+            return _attached
+
+    # Threads of this process share one refresh, and keep the attached version until it is done
+    stale = attached if stale_while_revalidate() else None
+    return _refreshes.do(version, refresh, stale)
@@ -0,0 +1,88 @@
+import os
+import time
+import logging
+import threading
+import weakref
+from concurrent.futures import Future, TimeoutError
+from metrics import SINGLE_FLIGHT_CALLS, SINGLE_FLIGHT_WAITING, SINGLE_FLIGHT_WAIT
+
+logger = logging.getLogger(__name__)
+
+def stale_while_revalidate():
+    # STALE_WHILE_REVALIDATE=0 makes every caller wait for the new version
+    return os.getenv('STALE_WHILE_REVALIDATE', '1') != '0'
+
+def wait_timeout():
+    # Longest wait on another caller's load before giving up on it
+    return float(os.getenv('SINGLE_FLIGHT_TIMEOUT', '300'))
+
+_instances = weakref.WeakSet()
+
+def _reset_after_fork():
+    # The loads in flight belong to threads of the parent, which do not exist in the child
+    for single_flight in list(_instances):
+        single_flight._inflight = {}
+        single_flight._lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+# Runs one load per key at a time. Concurrent callers of the same key wait on the
+# leader's future instead of loading again; callers holding a previous value get it
+# back at once while the load runs in a background thread.
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._inflight = {}
+        self._lock = threading.Lock()
+        _instances.add(self)
+
+    def _run(self, key, load, future):
+        try:
+            future.set_result(load())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            # A waiter that timed out may have replaced this load with a newer one
+            with self._lock:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+    def _refresh(self, key, load, future):
+        self._run(key, load, future)
+        if future.exception() is not None:
+            # Nobody waits on a background refresh, the next call retries it
+            logger.error(f"Background reload of {self.name} failed: {future.exception()}")
+
+    def do(self, key, load, stale=None):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if stale is not None:
+            if leader:
+                threading.Thread(target=self._refresh, args=(key, load, future), name=f'reload-{self.name}', daemon=True).start()
+            SINGLE_FLIGHT_CALLS.inc(loader=self.name, result='stale')
+            return stale
+
+        if leader:
+            SINGLE_FLIGHT_CALLS.inc(loader=self.name, result='load')
+            self._run(key, load, future)
+            return future.result()
+
+        SINGLE_FLIGHT_CALLS.inc(loader=self.name, result='wait')
+        SINGLE_FLIGHT_WAITING.inc(loader=self.name)
+        start = time.perf_counter()
+        try:
+            return future.result(wait_timeout())
+        except TimeoutError:
+            # The leader is stuck: forget its load so that the next caller starts a new one
+            with self._lock:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+            logger.error(f"Gave up waiting for {self.name} after {wait_timeout()} s")
+            raise
+        finally:
+            SINGLE_FLIGHT_WAITING.inc(-1, loader=self.name)
+            SINGLE_FLIGHT_WAIT.observe(time.perf_counter() - start, loader=self.name)
@@ -0,0 +1,77 @@
+import os
+import sqlite3
+from datetime import datetime, timezone
+from flask import g
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS candidature_lavorate (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    candidatureId TEXT NOT NULL UNIQUE,
+    username TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS document_feedback (
+    candidatureId TEXT NOT NULL,
+    documentClass TEXT NOT NULL,
+    userFeedback TEXT NOT NULL,
+    lastmodifyUsers TEXT NOT NULL,
+    modifyTimestamp TEXT NOT NULL,
+    PRIMARY KEY (candidatureId, documentClass)
+);
+"""
+
+FEEDBACK_FIELDS = ('userFeedback', 'lastmodifyUsers', 'modifyTimestamp')
+
+def connect(path=None):
+    conn = sqlite3.connect(path or os.getenv('STORE_PATH', 'controlli.db'), timeout=30)
+    # WAL lets reviewers read while another worker appends, NORMAL sync is safe in WAL mode
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+def get_store():
+    if 'store' not in g:
+        g.store = connect()
+    return g.store
+
+def close_store(e=None):
+    conn = g.pop('store', None)
+    if conn is not None:
+        conn.close()
+
+def save_lavorata(conn, candidature_id, username):
+    # Append-only: the first marking of a candidatura is kept, a concurrent or repeated one
+    # is ignored by the UNIQUE constraint. True when this call added the row
+    with conn:
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO candidature_lavorate (candidatureId, username, timestamp) VALUES (?, ?, ?)',
+            (candidature_id, username, datetime.now(timezone.utc).isoformat()),
+        )
+    return cursor.rowcount == 1
+
+def load_lavorate(conn):
+    return {row[0] for row in conn.execute('SELECT candidatureId FROM candidature_lavorate')}
+
+def is_lavorata(conn, candidature_id):
+    cursor = conn.execute('SELECT 1 FROM candidature_lavorate WHERE candidatureId = ? LIMIT 1', (candidature_id,))
+    return cursor.fetchone() is not None
+
+def upsert_feedback(conn, entries):
+    # One transaction for the whole batch; the newest modifyTimestamp wins, so replayed
+    # or out-of-order batches from other workers never overwrite a later edit
+    with conn:
+        conn.executemany(
+            'INSERT INTO document_feedback (candidatureId, documentClass, userFeedback, lastmodifyUsers, modifyTimestamp) '
+            'VALUES (?, ?, ?, ?, ?) ON CONFLICT (candidatureId, documentClass) DO UPDATE SET '
+            'userFeedback = excluded.userFeedback, lastmodifyUsers = excluded.lastmodifyUsers, modifyTimestamp = excluded.modifyTimestamp '
+            'WHERE excluded.modifyTimestamp >= document_feedback.modifyTimestamp',
+            [(e['candidatureId'], e['documentClass']) + tuple(e[field] for field in FEEDBACK_FIELDS) for e in entries],
+        )
+
+def load_feedback(conn, candidature_id):
+    cursor = conn.execute(
+        'SELECT documentClass, userFeedback, lastmodifyUsers, modifyTimestamp FROM document_feedback WHERE candidatureId = ?',
+        (candidature_id,),
+    )
+    return {row[0]: dict(zip(FEEDBACK_FIELDS, row[1:])) for row in cursor}
@@ -6,6 +6,8 @@ from streamlit_authenticator.utilities import (CredentialsError, ForgotError, Ha
 import pandas as pd
 import numpy as np
 import os
+from status_vocabulary import POSSIBLE_VALUES_DOCUMENTI, POSSIBLE_VALUES_CHECKLIST, style_statuses
+from reconciliation import reconcile
 
 # Function to generate sample data
 def generate_sample_data():
@@ -102,30 +104,18 @@ def generate_data():
 
     candidature_checklist = pd.read_parquet('/Users/gabbo/Code/Work/GitHub/pdnd-dtd-pad26-pdf/data/20240805_candidature_checklist.parquet')
     file_status_report = pd.read_excel('/Users/gabbo/Code/Work/GitHub/pdnd-dtd-pad26-pdf/code/log/20240805_file_status_report_all.xlsx')
-    # Ensure indices are aligned properly before assigning values
-    file_status_report.set_index('Candidatura', inplace=True)
-
-    possible_values_documenti = {
-        "Stato_Contratto_SA_SR":                                ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Determina_Affidamento_Aggiudicazione_Servizio":  ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Proposta_Commerciale":                           ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Documento_Stipula_MEPA":                         ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Convenzione_Accordo":                            ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Checklist_Asseverazione":                        ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Certificato_Regolare_Esec":                      ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        "Stato_Allegato_5":                                     ["Documento valido", "Documento non presente", "Documento errato", "Documento non supportato", "Errori nei controlli"], 
-        }
+    # Align the report on the master list: candidature without a PDF become 'Documento non presente'
+    reconciled = reconcile(candidature_checklist, {'Stato_Checklist_Asseverazione': file_status_report})
+    file_status_report = reconciled.reports['Stato_Checklist_Asseverazione']
+    print(f"Candidature senza documento: {len(reconciled.missing['Stato_Checklist_Asseverazione'])}, "
+          f"documenti orfani: {len(reconciled.orphans['Stato_Checklist_Asseverazione'])}")
+
+    possible_values_documenti = POSSIBLE_VALUES_DOCUMENTI
     
     # Derive columns_checklist from the keys of possible_values_checklist
     columns_documenti = list(possible_values_documenti.keys())
 
-    possible_values_checklist = {
-        "Stato_CUP":                    ['Codice corretto',                     'Codice errato', 'Codice assente',      'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
-        "Stato_Firma_Asseveratore":     ['Firma presente', 'Documento p7m',     'Firma assente',                        'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
-        "Stato_Anagrafica_SA":          ['Dati corretti',                       'Dati non corrispondenti',              'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
-        "Stato_Compilazione_Checklist": ['Compilazione corretta',               'Compilazione errata',                  'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
-        "Esito_Conformità_Tecnica":     ['Positivo',                            'Negativo', 'Campo nullo',              'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente']
-    }
+    possible_values_checklist = POSSIBLE_VALUES_CHECKLIST
 
     # Derive columns_checklist from the keys of possible_values_checklist
     columns_checklist = list(possible_values_checklist.keys())
@@ -162,20 +152,6 @@ def generate_data():
 
     return df, df_checklist
 
-def color_cells(val):
-    color = 'white'
-    if val in ['Documento non supportato', 'Controllo non supportato']:
-        color = 'blue'
-    elif val in ['Documento valido', 'Codice corretto', 'Firma presente', 'Documento p7m', 'Dati corretti', 'Compilazione corretta', 'Positivo']:
-        color = 'lightgreen'
-    elif val in ['Documento errato', 'Codice errato', 'Verifica manuale', 'Dati non corrispondenti', 'Compilazione errata', 'Negativo']:
-        color = 'orange'
-    elif val in ['Errore nel controllo', 'Errori nei controlli']:
-        color = 'yellow'
-    elif val in ['Documento non presente', 'Codice assente', 'Firma assente', 'Campo nullo']:
-        color = 'red'
-    return f'background-color: {color}'
-
 # Loading config file
 with open('config.yaml', 'r', encoding='utf-8') as file:
     config = yaml.load(file, Loader=SafeLoader)
@@ -238,7 +214,7 @@ if st.session_state["authentication_status"]:
 
         if selected_candidatura in df.index:
             st.write(f"Dettagli per la candidatura '{selected_candidatura}':")
-            st.dataframe(df.loc[[selected_candidatura]].T.style.applymap(color_cells))
+            st.dataframe(style_statuses(df.loc[[selected_candidatura]].T))
             
             # Document selection and Save button in the sidebar
             document_options = df.columns.tolist()
@@ -265,7 +241,7 @@ if st.session_state["authentication_status"]:
             if selected_document:
                 if selected_document == 'Stato_Checklist_Asseverazione':
                     st.write(f"Dettagli dei controlli per il documento '{selected_document}':")
-                    st.dataframe(df_checklist.loc[selected_candidatura, :].to_frame().style.applymap(color_cells))
+                    st.dataframe(style_statuses(df_checklist.loc[selected_candidatura, :].to_frame()))
                 else:
                     st.write(f"Documento non ancora supportato")
         else:
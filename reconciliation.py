@@ -0,0 +1,30 @@
+from collections import namedtuple
+import pandas as pd
+
+# reports: each document report aligned on the master list, indexed by the key
+# missing: master candidature absent from each report
+# orphans: report candidature absent from the master list
+Reconciliation = namedtuple('Reconciliation', ['reports', 'missing', 'orphans'])
+
+MISSING_DOCUMENT = 'Documento non presente'
+
+def reconcile(candidature, reports, key='Candidatura', fill_value=MISSING_DOCUMENT):
+    master = pd.DataFrame({key: pd.Index(candidature[key]).drop_duplicates()})
+
+    aligned, missing, orphans = {}, {}, {}
+    for name, report in reports.items():
+        report = report.drop_duplicates(key, keep='last')
+        # One outer merge gives the join and both anti-joins through the indicator column
+        merged = master.merge(report, on=key, how='outer', indicator=True, sort=False)
+        side = merged.pop('_merge')
+
+        missing[name] = pd.Index(merged.loc[side == 'left_only', key])
+        orphans[name] = pd.Index(merged.loc[side == 'right_only', key])
+
+        in_master = (side != 'right_only').to_numpy()
+        report_aligned = merged[in_master].copy()
+        value_columns = [column for column in report.columns if column != key]
+        report_aligned.loc[(side[in_master] == 'left_only').to_numpy(), value_columns] = fill_value
+        aligned[name] = report_aligned.set_index(key)
+
+    return Reconciliation(aligned, missing, orphans)
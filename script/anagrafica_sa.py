@@ -0,0 +1,230 @@
+import os
+import re
+import sys
+import argparse
+import unicodedata
+import numpy as np
+import pandas as pd
+from text_store import update_text_store, load_store, candidature_texts
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from storage import read_table
+
+# Fiscal code of a public body: eleven digits, after its label when there is one
+CF_LABEL = r'(?:codice\s+fiscale|c\.\s?f\.|partita\s+iva|p\.\s?iva)'
+CF_PATTERN = re.compile(CF_LABEL + r'\s*(?:n\.|n°)?\s*[:\-]?\s*(\d{11})\b', re.IGNORECASE)
+ANY_CF_PATTERN = re.compile(r'\b(\d{11})\b')
+# Name of the soggetto attuatore: the rest of the labelled line, up to a fiscal code on the same line
+NAME_PATTERN = re.compile(r'(?:soggetto\s+attuatore|ente\s+attuatore|denominazione(?:\s+(?:dell\'ente|ente))?)\s*[:\-]\s*([^\n]+)', re.IGNORECASE)
+NAME_END = re.compile(r'\s*[,;(\-–]*\s*' + CF_LABEL + r'.*$', re.IGNORECASE)
+
+# Outcomes from the weakest to the strongest: a candidatura with several PDFs keeps the strongest
+OUTCOMES = ['Errore nel controllo', 'Verifica manuale', 'Dati non corrispondenti', 'Dati corretti']
+
+def normalize_name(name):
+    # Upper case, no accents or punctuation, single spaces
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r'[^0-9A-Za-z]+', ' ', name).upper().split())
+
+def trigrams(name):
+    padded = f' {name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# Index over the registry of the soggetti attuatori: a dict for the exact match on the fiscal
+# code and a trigram inverted index (postings of every trigram in one array, CSR style) for
+# the approximate match on the name. Names are matched in batches with numpy: only the
+# entities sharing the rarer trigrams of a name are counted, never the whole registry.
+class RegistryIndex:
+    # Trigrams found in more than this share of the registry ('COM', 'UNE', ...) only
+    # select candidates when a name has nothing rarer
+    MAX_POSTING_SHARE = 0.02
+    MIN_PROBES = 5
+    # Candidates scored exactly per name: few probes give many ties on the shared count,
+    # and with 5 the closest entity was left out for about a fifth of the misspelt names
+    CANDIDATES = 50
+    BATCH = 500
+
+    def __init__(self, codici_fiscali, denominazioni):
+        self.codici_fiscali = np.asarray(codici_fiscali, dtype=object)
+        self.denominazioni = np.asarray(denominazioni, dtype=object)
+        self.names = [normalize_name(name) for name in self.denominazioni]
+        self.by_codice = {codice: row for row, codice in enumerate(self.codici_fiscali)}
+
+        self.vocabulary = {}
+        self.entity_trigrams = []
+        entity_rows, trigram_ids = [], []
+        for row, name in enumerate(self.names):
+            ids = {self.vocabulary.setdefault(trigram, len(self.vocabulary)) for trigram in trigrams(name)}
+            self.entity_trigrams.append(ids)
+            entity_rows.extend([row] * len(ids))
+            trigram_ids.extend(ids)
+        trigram_ids = np.array(trigram_ids, dtype=np.int64)
+        # Trigrams of every entity, in row order, to score many candidates at once
+        self.entity_sizes = np.array([len(ids) for ids in self.entity_trigrams], dtype=np.int64)
+        self.entity_offsets = np.concatenate([[0], np.cumsum(self.entity_sizes)])
+        self.entity_postings = trigram_ids
+        order = np.argsort(trigram_ids, kind='stable')
+        self.postings = np.array(entity_rows, dtype=np.int64)[order]
+        self.frequency = np.bincount(trigram_ids, minlength=len(self.vocabulary))
+        self.offsets = np.concatenate([[0], np.cumsum(self.frequency)])
+        self.max_posting = max(1, int(len(self.names) * self.MAX_POSTING_SHARE))
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_file(cls, path, cf_column='Codice_fiscale', name_column='Denominazione'):
+        registry = read_table(path, [cf_column, name_column]).dropna()
+        codici = registry[cf_column].astype(str).str.strip().str.zfill(11)
+        return cls(codici.to_numpy(), registry[name_column].astype(str).to_numpy())
+
+    def lookup(self, codici_fiscali):
+        # Registry row of every fiscal code, -1 when it is not in the registry
+        return pd.Series(codici_fiscali).map(self.by_codice).fillna(-1).astype(np.int64).to_numpy()
+
+    def _jaccard(self, name_trigrams, row):
+        # Trigrams missing from the registry match nothing but still count in the union
+        entity = self.entity_trigrams[row]
+        common = sum(1 for trigram in name_trigrams if self.vocabulary.get(trigram) in entity)
+        return common / (len(name_trigrams) + len(entity) - common)
+
+    def similarity(self, names, rows):
+        # Similarity of every normalized name with the registered name of its row
+        pairs = pd.DataFrame({'name': names, 'row': rows})
+        unique = pairs.drop_duplicates()
+        scores = [1.0 if name == self.names[row] else self._jaccard(trigrams(name), row)
+                  for name, row in zip(unique['name'].tolist(), unique['row'].tolist())]
+        return pairs.merge(unique.assign(score=scores), on=['name', 'row'], how='left')['score'].to_numpy()
+
+    def _jaccard_pairs(self, query_ids, query_sizes, queries, rows):
+        # Exact Jaccard of many (query, entity) pairs: each trigram of the entity is looked up
+        # among the known trigrams of its query, the unknown ones only count in the union
+        sizes = self.entity_sizes[rows]
+        pair = np.repeat(np.arange(len(rows)), sizes)
+        starts = np.repeat(self.entity_offsets[rows] - np.concatenate([[0], np.cumsum(sizes)[:-1]]), sizes)
+        entity_keys = queries[pair] * len(self.vocabulary) + self.entity_postings[starts + np.arange(sizes.sum())]
+        query_keys = np.fromiter((q * len(self.vocabulary) + i for q, ids in enumerate(query_ids) for i in ids), dtype=np.int64)
+        common = np.bincount(pair, weights=np.isin(entity_keys, query_keys), minlength=len(rows))
+        return common / (query_sizes[queries] + sizes - common)
+
+    def _probes(self, ids):
+        known = sorted((self.frequency[i], i) for i in ids)
+        rare = [i for frequency, i in known if frequency <= self.max_posting]
+        return rare if len(rare) >= self.MIN_PROBES else [i for _, i in known[:self.MIN_PROBES]]
+
+    def _match_batch(self, names):
+        best_row = np.full(len(names), -1, dtype=np.int64)
+        best_score = np.zeros(len(names))
+        query_trigrams = [trigrams(name) for name in names]
+        query_ids = [{self.vocabulary[t] for t in tri if t in self.vocabulary} for tri in query_trigrams]
+        probes = [self._probes(ids) for ids in query_ids]
+        query = np.repeat(np.arange(len(names)), [len(p) for p in probes])
+        probe = np.fromiter((i for p in probes for i in p), dtype=np.int64, count=len(query))
+        if not len(probe):
+            return best_row, best_score
+
+        # (query, entity) for every posting of every probe, counted to rank the candidates
+        lengths = self.frequency[probe]
+        starts = np.repeat(self.offsets[probe] - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        entities = self.postings[starts + np.arange(lengths.sum())]
+        keys, counts = np.unique(np.repeat(query, lengths) * len(self.names) + entities, return_counts=True)
+        pairs = np.lexsort((-counts, keys // len(self.names)))
+        candidate_query, candidate_entity = keys[pairs] // len(self.names), keys[pairs] % len(self.names)
+        group_start = np.searchsorted(candidate_query, candidate_query)
+        top = np.arange(len(pairs)) - group_start < self.CANDIDATES
+
+        # Exact Jaccard on the full trigram sets, for the few candidates of each name;
+        # the best one of each name, the first row on a tie
+        candidate_query, candidate_entity = candidate_query[top], candidate_entity[top]
+        query_sizes = np.array([len(tri) for tri in query_trigrams], dtype=np.int64)
+        scores = self._jaccard_pairs(query_ids, query_sizes, candidate_query, candidate_entity)
+        best = np.lexsort((candidate_entity, -scores, candidate_query))
+        first = best[np.r_[True, candidate_query[best][1:] != candidate_query[best][:-1]]]
+        best_row[candidate_query[first]] = candidate_entity[first]
+        best_score[candidate_query[first]] = scores[first]
+        return best_row, best_score
+
+    def match_names(self, names):
+        # Registry row and similarity of the closest entity to every normalized name
+        unique, inverse = np.unique(np.asarray(names, dtype=object), return_inverse=True)
+        rows = np.full(len(unique), -1, dtype=np.int64)
+        scores = np.zeros(len(unique))
+        for start in range(0, len(unique), self.BATCH):
+            batch = slice(start, start + self.BATCH)
+            rows[batch], scores[batch] = self._match_batch(unique[batch])
+        return rows[inverse], scores[inverse]
+
+def extract_fields(texts):
+    # Fiscal code and name of the soggetto attuatore in every text, '' when not found
+    codici = texts.str.extract(CF_PATTERN, expand=False)
+    unlabelled = codici.isna()
+    codici[unlabelled] = texts[unlabelled].str.extract(ANY_CF_PATTERN, expand=False)
+    codici = codici.fillna('')
+    names = texts.str.extract(NAME_PATTERN, expand=False).fillna('').str.replace(NAME_END, '', regex=True).str.strip()
+    return codici, names
+
+def check_anagrafica(texts, index, threshold=0.6):
+    # texts: Candidatura, text, error (one row per PDF); index: RegistryIndex of the registry
+    codici, names = extract_fields(texts['text'])
+    unique_names = names.unique()
+    normalized = names.map(dict(zip(unique_names, map(normalize_name, unique_names))))
+    has_codice = (codici != '').to_numpy()
+    has_name = (normalized != '').to_numpy()
+
+    # Exact match on the fiscal code, the name is then compared with the registered one
+    rows = index.lookup(codici)
+    known = rows >= 0
+    scores = np.zeros(len(texts))
+    scores[known & has_name] = index.similarity(normalized[known & has_name].to_numpy(), rows[known & has_name])
+
+    # Otherwise the name alone is looked up in the trigram index
+    by_name = ~known & has_name
+    rows[by_name], scores[by_name] = index.match_names(normalized[by_name].to_numpy())
+    named = by_name & (rows >= 0) & (scores >= threshold)
+    rows[by_name & ~named] = -1
+
+    # From the weakest to the strongest outcome, each assignment overrides the previous ones
+    status = np.full(len(texts), 'Verifica manuale', dtype=object)
+    status[known & has_name & (scores < threshold)] = 'Dati non corrispondenti'
+    status[has_codice & ~known] = 'Dati non corrispondenti'
+    status[known & has_name & (scores >= threshold)] = 'Dati corretti'
+    status[(texts['error'] != '').to_numpy()] = 'Errore nel controllo'
+
+    matched = rows >= 0
+    report = pd.DataFrame({
+        'Candidatura': texts['Candidatura'].to_numpy(),
+        'Stato_Anagrafica_SA': status,
+        'CF_trovato': codici.to_numpy(),
+        'Denominazione_trovata': names.to_numpy(),
+        'CF_anagrafica': np.where(matched, index.codici_fiscali[np.maximum(rows, 0)], ''),
+        'Denominazione_anagrafica': np.where(matched, index.denominazioni[np.maximum(rows, 0)], ''),
+        'Somiglianza': np.where(matched, scores, np.nan).round(3),
+    })
+    # One row per candidatura, the one with the strongest outcome
+    rank = report['Stato_Anagrafica_SA'].map({outcome: i for i, outcome in enumerate(OUTCOMES)})
+    report = report.iloc[np.argsort(rank.to_numpy(), kind='stable')].drop_duplicates('Candidatura', keep='last')
+    return report.sort_values('Candidatura').reset_index(drop=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Controllo dell'anagrafica del soggetto attuatore nelle checklist di asseverazione")
+    parser.add_argument('pdf_dir', help='Cartella dei PDF, con il codice della candidatura nel nome del file')
+    parser.add_argument('registry', help='Parquet, Excel o CSV con codice fiscale e denominazione dei soggetti attuatori')
+    parser.add_argument('--cf-column', default='Codice_fiscale')
+    parser.add_argument('--name-column', default='Denominazione')
+    parser.add_argument('--threshold', type=float, default=0.6, help='Somiglianza minima dei nomi (Jaccard sui trigrammi)')
+    parser.add_argument('--store', default='../data/text_store.parquet', help='Cache dei testi estratti')
+    parser.add_argument('--out', default='../data/anagrafica_report.parquet')
+    parser.add_argument('--workers', type=int, default=None, help='Processi di estrazione, di default uno per core')
+    parser.add_argument('--skip-extraction', action='store_true', help='Usa solo i testi già nella cache')
+    args = parser.parse_args()
+
+    texts = load_store(args.store) if args.skip_extraction else update_text_store(args.pdf_dir, args.store, args.workers)
+    index = RegistryIndex.from_file(args.registry, args.cf_column, args.name_column)
+    report = check_anagrafica(candidature_texts(texts), index, args.threshold)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    report.to_parquet(args.out, index=False)
+    print(report['Stato_Anagrafica_SA'].value_counts().to_string())
+    print(f"Report written to {args.out}")
+
+if __name__ == '__main__':
+    main()
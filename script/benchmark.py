@@ -0,0 +1,340 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+import tracemalloc
+import pandas as pd
+from synthetic_data import write_dataset
+from create_json_candidature import build_candidatura, write_json, write_sharded
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT)
+from status_vocabulary import style_statuses
+import storage
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+def import_backend(module_name):
+    backend_dir = os.path.join(ROOT, 'flask_backend')
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+    return __import__(module_name)
+
+def stage_generate_data(ctx):
+    app = import_backend('app')
+    return lambda: app.generate_data()
+
+def stage_create_json(ctx):
+    # Documents built and written to a single candidatura.json, as create_json_candidature.py does
+    file_status_report = pd.read_excel(ctx['paths']['excel'])
+    out_path = os.path.join(ctx['data_dir'], 'single', 'candidatura.json')
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    return lambda: write_json(build_candidatura(file_status_report), out_path)
+
+# Peak RSS of the processes of a command. A process starts with the peak RSS of the one that
+# forked it, so the command is started by this small interpreter instead of the benchmark
+RSS_PROBE = '''
+import sys, resource, subprocess
+subprocess.run(sys.argv[1:], check=True)
+print(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+'''
+
+# A stage whose work runs in child processes, which tracemalloc does not see: `run` is timed,
+# the memory comes from the same work started as a command
+class ChildRun:
+    def __init__(self, run, args, cwd=None, env=None):
+        self.run = run
+        self.args = args
+        self.cwd = cwd
+        self.env = env
+
+    def __call__(self):
+        return self.run()
+
+    def peak_rss_mb(self):
+        result = subprocess.run([sys.executable, '-c', RSS_PROBE, *self.args], cwd=self.cwd, env=self.env,
+                                check=True, capture_output=True, text=True)
+        # Kilobytes on Linux, bytes on macOS
+        max_rss = int(result.stdout.split()[-1])
+        return round(max_rss / (2**20 if sys.platform == 'darwin' else 2**10), 2)
+
+SHARDED_RUN = '''
+import sys
+import pandas as pd
+from create_json_candidature import write_sharded
+workers = int(sys.argv[3])
+write_sharded(pd.read_excel(sys.argv[1]), sys.argv[2], workers, 'json', workers)
+'''
+
+def stage_create_json_sharded(ctx):
+    # Same work as create_json, JSON parts included, with one shard per worker process
+    file_status_report = pd.read_excel(ctx['paths']['excel'])
+    out_dir = os.path.join(ctx['data_dir'], 'sharded')
+    args = [sys.executable, '-c', SHARDED_RUN, ctx['paths']['excel'], out_dir, str(ctx['workers'])]
+    return ChildRun(lambda: write_sharded(file_status_report, out_dir, ctx['workers'], 'json', ctx['workers']),
+                    args, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+def stage_cup_check(ctx):
+    # Regex pass and join over already extracted texts, PDF extraction excluded
+    from synthetic_data import generate_expected_cup, generate_checklist_texts
+    from cup_check import check_cup
+    expected = generate_expected_cup(pd.read_parquet(ctx['paths']['parquet']))
+    texts = generate_checklist_texts(expected)
+    expected = expected.rename(columns={'CUP': 'CUP_atteso'})
+    return lambda: check_cup(texts, expected)
+
+def stage_anagrafica_check(ctx):
+    # Field extraction and lookups in the registry index of 20k soggetti attuatori
+    from synthetic_data import generate_expected_cup, generate_checklist_texts, generate_registry
+    from anagrafica_sa import RegistryIndex, check_anagrafica
+    registry = generate_registry()
+    texts = generate_checklist_texts(generate_expected_cup(pd.read_parquet(ctx['paths']['parquet'])), registry)
+    return lambda: check_anagrafica(texts, RegistryIndex(registry['Codice_fiscale'], registry['Denominazione']))
+
+def stage_api_data(ctx):
+    # Measured with the files already loaded, see cold() for the first request
+    client = import_backend('app_v2').app.test_client()
+
+    def run():
+        return client.get('/api/data').get_data()
+    run()
+    return run
+
+def stage_api_detail(ctx):
+    client = import_backend('app_v2').app.test_client()
+    with open(ctx['paths']['candidature'], 'r') as json_file:
+        candidature_ids = [doc['candidatureId'] for doc in json.load(json_file)]
+    sample = candidature_ids[::max(1, len(candidature_ids) // ctx['detail_requests'])][:ctx['detail_requests']]
+
+    def run():
+        for candidatura_id in sample:
+            client.get(f'/api/detail/{candidatura_id}').get_data()
+    run()
+    return run
+
+def clear_backend_caches():
+    app = import_backend('app_v2')
+    app._cache.clear()
+    app._matrix = (None, None)
+    app._bitmap_index = (None, None)
+
+def cold(stage):
+    # Same requests, with the JSON files read and indexed again by every run
+    def cold_stage(ctx):
+        run = stage(ctx)
+
+        def cold_run():
+            clear_backend_caches()
+            return run()
+        return cold_run
+    return cold_stage
+
+def stage_load_json(ctx):
+    app = import_backend('app_v2')
+
+    def run():
+        # Kept alive until the end of the run, so the peak includes the loaded dataset
+        with open(ctx['paths']['candidatura'], 'r') as json_file:
+            return app.index_candidatura(json.load(json_file))
+    return run
+
+def stage_load_lean(ctx):
+    app = import_backend('app_v2')
+    lean_json = import_backend('lean_json')
+    return lambda: app.index_candidatura(lean_json.iter_documents(ctx['paths']['candidatura']))
+
+# Run in a fresh interpreter: import, warm-up until /readyz, then one detail request
+STARTUP_PROBE = '''
+import sys, time
+import app_v2
+client = app_v2.app.test_client()
+while client.get('/readyz').get_json()['status'] == 'warming up':
+    time.sleep(0.005)
+assert client.get('/api/detail/' + sys.argv[1]).status_code == 200
+'''
+
+def startup_run(ctx, env):
+    with open(ctx['paths']['candidature'], 'r') as json_file:
+        candidatura_id = json.load(json_file)[0]['candidatureId']
+    env = {**os.environ, 'WARM_UP': '1', **env}
+    backend_dir = os.path.join(ROOT, 'flask_backend')
+    args = [sys.executable, '-c', STARTUP_PROBE, candidatura_id]
+    return ChildRun(lambda: subprocess.run(args, cwd=backend_dir, env=env, check=True), args, cwd=backend_dir, env=env)
+
+def stage_startup(ctx):
+    return startup_run(ctx, {})
+
+def stage_startup_snapshot(ctx):
+    # Every run after the first restores the Arrow file written by the previous one
+    return startup_run(ctx, {'SHARED_DATASET_PATH': os.path.join(ctx['data_dir'], 'candidatura.arrow')})
+
+def stage_s3_read(ctx):
+    # Needs an S3 stand-in: S3_ENDPOINT_URL (moto server, MinIO) and an S3_BUCKET to upload to
+    fs = storage.get_filesystem()
+    bucket = os.environ['S3_BUCKET']
+    if not fs.exists(bucket):
+        fs.mkdir(bucket)
+    uris = {}
+    for kind in ('parquet', 'excel', 'candidatura'):
+        uris[kind] = f"s3://{bucket}/benchmark/{ctx['n']}/{os.path.basename(ctx['paths'][kind])}"
+        fs.put_file(ctx['paths'][kind], uris[kind])
+    os.environ['STORAGE_CACHE_DIR'] = os.path.join(ctx['data_dir'], 'storage_cache')
+    os.environ['STORAGE_REVALIDATE_SECONDS'] = '0'
+
+    def run():
+        before = storage.storage_stats()
+        storage.read_parquet(uris['parquet'], columns=['Candidatura'])
+        storage.read_excel(uris['excel'])
+        storage.local_path(uris['candidatura'])
+        after = storage.storage_stats()
+        sizes = sum(os.path.getsize(ctx['paths'][kind]) for kind in uris)
+        # Only the first run downloads Excel and JSON, Parquet fetches the candidature column every time
+        print(f"  s3: {after['fetched'] - before['fetched']} byte scaricati, "
+              f"{after['cached'] - before['cached']} dalla cache, {sizes} byte in totale")
+    return run
+
+def stage_render(ctx):
+    df, df_checklist = import_backend('app').generate_data()
+    max_elements = df.size + df_checklist.size + 1
+
+    def run():
+        with pd.option_context('styler.render.max_elements', max_elements):
+            style_statuses(df).to_html()
+            style_statuses(df_checklist).to_html()
+    return run
+
+STAGES = {
+    'generate_data': stage_generate_data,
+    'create_json': stage_create_json,
+    'create_json_sharded': stage_create_json_sharded,
+    'cup_check': stage_cup_check,
+    'anagrafica_check': stage_anagrafica_check,
+    'api_data': stage_api_data,
+    'api_detail': stage_api_detail,
+    'api_data_cold': cold(stage_api_data),
+    'api_detail_cold': cold(stage_api_detail),
+    'load_json': stage_load_json,
+    'load_lean': stage_load_lean,
+    'startup': stage_startup,
+    'startup_snapshot': stage_startup_snapshot,
+    'render': stage_render,
+    's3_read': stage_s3_read,
+}
+
+# Stages measured once per worker count of --workers, to show how they scale with cores
+PER_WORKERS = {'create_json_sharded'}
+
+def stage_key(name, n, workers=None):
+    return f'{name}@{n}' if workers is None else f'{name}@{n}/{workers}w'
+
+def worker_counts(spec):
+    # '1,2,N': N is the number of cores
+    counts = [os.cpu_count() if count == 'N' else int(count) for count in spec.split(',')]
+    return sorted(set(counts))
+
+# Stages that only run when asked for with --stages or when their service is configured
+def default_stages():
+    return [name for name in STAGES if name != 's3_read' or os.getenv('S3_BUCKET')]
+
+def measure(run, repeat):
+    # Time is the best of `repeat` untraced runs. Memory comes from one more run: the peak of the
+    # Python allocations of this process, or for a ChildRun the peak RSS of its largest process
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    if isinstance(run, ChildRun):
+        return {'time_s': round(min(times), 4), 'rss_mb': run.peak_rss_mb()}
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'time_s': round(min(times), 4), 'peak_mb': round(peak / 2**20, 2)}
+
+def compare(results, baseline, tolerance):
+    # A stage without a reference fails too, otherwise a stale baseline would check nothing
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            regressions.append(f"{key}: not in the baseline, run with --update-baseline to add it")
+            continue
+        for metric in ('time_s', 'peak_mb', 'rss_mb'):
+            if metric not in result:
+                continue
+            if metric not in baseline[key]:
+                regressions.append(f"{key} {metric}: not in the baseline, run with --update-baseline to add it")
+                continue
+            reference = baseline[key][metric]
+            if reference and result[metric] > reference * (1 + tolerance):
+                regressions.append(f"{key} {metric}: {result[metric]} > {reference} (+{tolerance:.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark delle fasi di generazione, API e rendering')
+    parser.add_argument('--scales', default='10000,100000', help='Numero di candidature, separati da virgola')
+    parser.add_argument('--stages', default=','.join(default_stages()))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--detail-requests', type=int, default=20)
+    parser.add_argument('--workers', default='1,2,N', help='Processi delle fasi parallele, separati da virgola (N = un processo per core)')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Peggioramento ammesso rispetto alla baseline')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    # In-process stages load on demand, the startup stages turn the warm-up back on
+    os.environ['WARM_UP'] = '0'
+    results = {}
+    for n in [int(scale) for scale in args.scales.split(',')]:
+        with tempfile.TemporaryDirectory() as data_dir:
+            paths = write_dataset(n, data_dir, seed=args.seed)
+            os.environ['PARQUET_PATH'] = paths['parquet']
+            os.environ['EXCEL_PATH'] = paths['excel']
+            os.environ['CANDIDATURE_PATH'] = paths['candidature']
+            os.environ['CANDIDATURA_PATH'] = paths['candidatura']
+            os.environ['STORE_PATH'] = os.path.join(data_dir, 'controlli.db')
+            os.environ['FEEDBACK_LOG_DIR'] = os.path.join(data_dir, 'feedback_log')
+            ctx = {'n': n, 'paths': paths, 'data_dir': data_dir, 'detail_requests': args.detail_requests}
+
+            for name in args.stages.split(','):
+                for workers in worker_counts(args.workers) if name in PER_WORKERS else [None]:
+                    key = stage_key(name, n, workers)
+                    result = results[key] = measure(STAGES[name]({**ctx, 'workers': workers}), args.repeat)
+                    memory = f"{result['peak_mb']:>10.2f} MB" if 'peak_mb' in result else f"{result['rss_mb']:>10.2f} MB RSS"
+                    print(f"{key:<32} {result['time_s']:>10.4f} s {memory}")
+
+            # Speed-up of the parallel stages over their single-process run
+            for name in PER_WORKERS & set(args.stages.split(',')):
+                single = results.get(stage_key(name, n, 1))
+                for workers in worker_counts(args.workers):
+                    if single and workers > 1:
+                        speedup = single['time_s'] / results[stage_key(name, n, workers)]['time_s']
+                        print(f"{stage_key(name, n, workers):<32} {speedup:>10.2f}x rispetto a 1 processo")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as json_file:
+            baseline = json.load(json_file)
+    elif not args.update_baseline:
+        print(f"Baseline {args.baseline} not found, run with --update-baseline to create it")
+        sys.exit(1)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as json_file:
+            json.dump(baseline, json_file, indent=4, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
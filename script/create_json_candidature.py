@@ -1,7 +1,55 @@
+import os
+import sys
 import json
+import zlib
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from dotenv import load_dotenv
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from reconciliation import reconcile
+from storage import is_remote, read_parquet, read_excel, storage_stats
+from check_reports import load_check_reports, check_status, NOT_SUPPORTED
+
+# Document classes that are not checked yet, in the order they are written out
+UNSUPPORTED_DOCUMENT_CLASSES = [
+    "Stato_Contratto_SA_SR",
+    "Stato_Determina_Affidamento_Aggiudicazione_Servizio",
+    "Stato_Proposta_Commerciale",
+    "Stato_Documento_Stipula_MEPA",
+    "Stato_Convenzione_Accordo",
+    "Stato_Certificato_Regolare_Esec",
+    "Stato_Allegato_5",
+]
+
+# Sharded output: one part file per shard plus a manifest the backend reads as one dataset
+PART_FORMATS = ('json', 'ndjson', 'parquet')
+PARTS_DIR = 'candidatura_parts'
+MANIFEST_NAME = 'candidatura.manifest.json'
+
+# Explicit, so parts holding only empty dettaglioCheck lists get the same schema
+DOCUMENT_SCHEMA = pa.schema([
+    ('candidatureId', pa.string()),
+    ('documentClass', pa.string()),
+    ('documentID', pa.string()),
+    ('modifyTimestamp', pa.string()),
+    ('documentType', pa.string()),
+    ('esitoChecks', pa.bool_()),
+    ('esitoCheckReason', pa.string()),
+    ('dettaglioCheck', pa.list_(pa.struct([
+        ('nomeCheck', pa.string()),
+        ('esitoCheck', pa.bool_()),
+        ('Descrizione', pa.string()),
+    ]))),
+    ('documentName', pa.string()),
+    ('userFeedback', pa.string()),
+    ('lastmodifyUsers', pa.string()),
+])
+
 def determine_stato_checklist(row):
     if row['Status'] == 'Documento non presente':
         return False, 'Documento non presente'
@@ -12,189 +60,197 @@ def determine_stato_checklist(row):
     elif row['Status'] in ['Errore nel controllo', 'EOF marker not found'] or row['Esito'] in ['Errore nel controllo', 'EOF marker not found']:
         return False, 'Errori nei controlli'
     else:
-        return ''
-
-
-# Load environment variables from .env file
-load_dotenv()
-
-# parquet_path = os.getenv('PARQUET_PATH')
-# candidature_checklist = pd.read_parquet(parquet_path)
-
-
-excel_path = os.getenv('EXCEL_PATH')
-candidature_checklist = pd.read_excel(excel_path)
-
-# Create the query result from the list of candidature IDs
-query_result = [{"candidatureId": candidature_id} for candidature_id in candidature_checklist['Candidatura'].to_list()]
-
-# Path to the JSON file
-json_file_path = '../data/candidature.json'
-
-# Write the JSON data to a file
-with open(json_file_path, 'w') as json_file:
-    json.dump(query_result, json_file, indent=4)
-
-print(f"JSON file written to {json_file_path}")
-
-# Convert the DataFrame to JSON format
-json_output = []
-
-for idx, row in candidature_checklist.iterrows():
-    
-    stato, reason = determine_stato_checklist(row)
-
-    json_output.append({
-        "candidatureId": row["Candidatura"],
-        "documentClass": "Stato_Checklist_Asseverazione",
-        "documentID": "",
-        "modifyTimestamp": "",
-        "documentType": "CandidaturaDocumento",
-        "esitoChecks": stato,
-        "esitoCheckReason": reason,
-        "dettaglioCheck": [
-            {
-                "nomeCheck": "Stato_CUP",
-                "esitoCheck": False,
-                "Descrizione": "Controllo non supportato"
-            },
-            {
-                "nomeCheck": "Stato_Firma_Asseveratore",
-                "esitoCheck": False,
-                "Descrizione": row['Status']
-            },
-            {
-                "nomeCheck": "Stato_Anagrafica_SA",
-                "esitoCheck": False,
-                "Descrizione": "Controllo non supportato"
-            },
-            {
-                "nomeCheck": "Stato_Compilazione_Checklist",
-                "esitoCheck": False,
-                "Descrizione": "Controllo non supportato"
-            },
-            {
-                "nomeCheck": "Esito_Conformità_Tecnica",
-                "esitoCheck": False,
-                "Descrizione": row["Esito"]
-            }
-        ],
-        "documentName": "",
-        "userFeedback": "",
-        "lastmodifyUsers": ""
-    })
-
-    json_output.append({
-        "candidatureId": row["Candidatura"],
-        "documentClass": "Stato_Contratto_SA_SR",
-        "documentID": "",
-        "modifyTimestamp": "",
-        "documentType": "CandidaturaDocumento",
-        "esitoChecks": False,
-        "esitoCheckReason": "Documento non supportato",
-        "dettaglioCheck": [],
-        "documentName": "",
-        "userFeedback": "",
-        "lastmodifyUsers": ""
-    })
-    
-    json_output.append({
-        "candidatureId": row["Candidatura"],
-        "documentClass": "Stato_Determina_Affidamento_Aggiudicazione_Servizio",
-        "documentID": "",
-        "modifyTimestamp": "",
-        "documentType": "CandidaturaDocumento",
-        "esitoChecks": False,
-        "esitoCheckReason": "Documento non supportato",
-        "dettaglioCheck": [],
-        "documentName": "",
-        "userFeedback": "",
-        "lastmodifyUsers": ""
-    })
-
-    json_output.append({
-        "candidatureId": row["Candidatura"],
-        "documentClass": "Stato_Proposta_Commerciale",
-        "documentID": "",
-        "modifyTimestamp": "",
-        "documentType": "CandidaturaDocumento",
-        "esitoChecks": False,
-        "esitoCheckReason": "Documento non supportato",
-        "dettaglioCheck": [],
-        "documentName": "",
-        "userFeedback": "",
-        "lastmodifyUsers": ""
-    })
-
-    json_output.append({
-        "candidatureId": row["Candidatura"],
-        "documentClass": "Stato_Documento_Stipula_MEPA",
-        "documentID": "",
-        "modifyTimestamp": "",
-        "documentType": "CandidaturaDocumento",
-        "esitoChecks": False,
-        "esitoCheckReason": "Documento non supportato",
-        "dettaglioCheck": [],
-        "documentName": "",
-        "userFeedback": "",
-        "lastmodifyUsers": ""
-    })
-
-    json_output.append({
-        "candidatureId": row["Candidatura"],
-        "documentClass": "Stato_Convenzione_Accordo",
-        "documentID": "",
-        "modifyTimestamp": "",
-        "documentType": "CandidaturaDocumento",
-        "esitoChecks": False,
-        "esitoCheckReason": "Documento non supportato",
-        "dettaglioCheck": [],
-        "documentName": "",
-        "userFeedback": "",
-        "lastmodifyUsers": ""
-    })
-
-    json_output.append({
-        "candidatureId": row["Candidatura"],
-        "documentClass": "Stato_Certificato_Regolare_Esec",
-        "documentID": "",
-        "modifyTimestamp": "",
-        "documentType": "CandidaturaDocumento",
-        "esitoChecks": False,
-        "esitoCheckReason": "Documento non supportato",
-        "dettaglioCheck": [],
-        "documentName": "",
-        "userFeedback": "",
-        "lastmodifyUsers": ""
-    })
-
-    json_output.append({
-        "candidatureId": row["Candidatura"],
-        "documentClass": "Stato_Allegato_5",
-        "documentID": "",
-        "modifyTimestamp": "",
-        "documentType": "CandidaturaDocumento",
-        "esitoChecks": False,
-        "esitoCheckReason": "Documento non supportato",
-        "dettaglioCheck": [],
-        "documentName": "",
-        "userFeedback": "",
-        "lastmodifyUsers": ""
-    })
-
-
-
-# Convert the list of JSON objects to a JSON string
-json_result = json.dumps(json_output, indent=4)
-
-# Print the JSON output
-print(json_output)
-
-# Path to the JSON file
-json_file_path = '../data/candidatura.json'
-
-# Write the JSON data to a file
-with open(json_file_path, 'w') as json_file:
-    json.dump(json_output, json_file, indent=4)
-
-print(f"JSON file written to {json_file_path}")
+        return False, ''
+
+def build_candidature(candidature_checklist):
+    # Create the query result from the list of candidature IDs
+    return [{"candidatureId": candidature_id} for candidature_id in candidature_checklist['Candidatura'].to_list()]
+
+def build_candidatura(candidature_checklist):
+    # Convert the DataFrame to JSON format
+    json_output = []
+
+    for idx, row in candidature_checklist.iterrows():
+
+        stato, reason = determine_stato_checklist(row)
+
+        json_output.append({
+            "candidatureId": row["Candidatura"],
+            "documentClass": "Stato_Checklist_Asseverazione",
+            "documentID": "",
+            "modifyTimestamp": "",
+            "documentType": "CandidaturaDocumento",
+            "esitoChecks": stato,
+            "esitoCheckReason": reason,
+            "dettaglioCheck": [
+                {
+                    "nomeCheck": "Stato_CUP",
+                    "esitoCheck": False,
+                    "Descrizione": row.get('Stato_CUP', NOT_SUPPORTED)
+                },
+                {
+                    "nomeCheck": "Stato_Firma_Asseveratore",
+                    "esitoCheck": False,
+                    "Descrizione": row['Status']
+                },
+                {
+                    "nomeCheck": "Stato_Anagrafica_SA",
+                    "esitoCheck": False,
+                    "Descrizione": row.get('Stato_Anagrafica_SA', NOT_SUPPORTED)
+                },
+                {
+                    "nomeCheck": "Stato_Compilazione_Checklist",
+                    "esitoCheck": False,
+                    "Descrizione": "Controllo non supportato"
+                },
+                {
+                    "nomeCheck": "Esito_Conformità_Tecnica",
+                    "esitoCheck": False,
+                    "Descrizione": row["Esito"]
+                }
+            ],
+            "documentName": "",
+            "userFeedback": "",
+            "lastmodifyUsers": ""
+        })
+
+        for document_class in UNSUPPORTED_DOCUMENT_CLASSES:
+            json_output.append({
+                "candidatureId": row["Candidatura"],
+                "documentClass": document_class,
+                "documentID": "",
+                "modifyTimestamp": "",
+                "documentType": "CandidaturaDocumento",
+                "esitoChecks": False,
+                "esitoCheckReason": "Documento non supportato",
+                "dettaglioCheck": [],
+                "documentName": "",
+                "userFeedback": "",
+                "lastmodifyUsers": ""
+            })
+
+    return json_output
+
+def write_json(data, json_file_path):
+    # Write the JSON data to a file
+    with open(json_file_path, 'w') as json_file:
+        json.dump(data, json_file, indent=4)
+
+    print(f"JSON file written to {json_file_path}")
+
+def shard_of(candidatura_id, n_shards):
+    # crc32 rather than hash(), which is salted per process for strings
+    return zlib.crc32(str(candidatura_id).encode('utf-8')) % n_shards
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part_file:
+        for block in iter(lambda: part_file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def write_part(documents, path, part_format):
+    tmp_path = f'{path}.tmp'
+    if part_format == 'json':
+        with open(tmp_path, 'w') as part_file:
+            json.dump(documents, part_file, indent=4)
+    elif part_format == 'ndjson':
+        with open(tmp_path, 'w') as part_file:
+            for document in documents:
+                part_file.write(json.dumps(document) + '\n')
+    else:
+        pq.write_table(pa.Table.from_pylist(documents, schema=DOCUMENT_SCHEMA), tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+def build_shard(task):
+    shard_index, n_shards, shard, out_dir, part_format = task
+    # Sorted by candidatura so the part does not depend on the order of the input rows
+    shard = shard.sort_values('Candidatura', kind='stable')
+    documents = build_candidatura(shard)
+
+    relative_path = os.path.join(PARTS_DIR, f'part-{shard_index:05d}-of-{n_shards:05d}.{part_format}')
+    path = os.path.join(out_dir, relative_path)
+    write_part(documents, path, part_format)
+    return {
+        'path': relative_path,
+        'candidature': len(shard),
+        'documents': len(documents),
+        'sha256': file_sha256(path),
+    }
+
+def write_sharded(candidature_checklist, out_dir, n_shards, part_format='json', workers=None):
+    os.makedirs(os.path.join(out_dir, PARTS_DIR), exist_ok=True)
+    shards = candidature_checklist['Candidatura'].map(lambda candidatura_id: shard_of(candidatura_id, n_shards))
+    rows = candidature_checklist.groupby(shards.to_numpy()).indices
+    tasks = [
+        (shard_index, n_shards, candidature_checklist.iloc[rows.get(shard_index, [])], out_dir, part_format)
+        for shard_index in range(n_shards)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parts = list(executor.map(build_shard, tasks))
+
+    # No timestamps or host data, so the same input gives a byte-identical manifest
+    manifest = {
+        'format': part_format,
+        'shards': n_shards,
+        'candidature': sum(part['candidature'] for part in parts),
+        'documents': sum(part['documents'] for part in parts),
+        'parts': parts,
+    }
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(f'{manifest_path}.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=4)
+    os.replace(f'{manifest_path}.tmp', manifest_path)
+
+    # Parts of a previous run with a different shard count or format are no longer referenced
+    current = {os.path.basename(part['path']) for part in parts}
+    for name in os.listdir(os.path.join(out_dir, PARTS_DIR)):
+        if name not in current:
+            os.remove(os.path.join(out_dir, PARTS_DIR, name))
+
+    print(f"{n_shards} part files and manifest written to {manifest_path}")
+    return manifest_path
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera candidature.json e candidatura.json dal report dei controlli')
+    parser.add_argument('--out', default='../data')
+    parser.add_argument('--shards', type=int, default=0, help='Numero di file parziali di candidatura (0 = un solo candidatura.json)')
+    parser.add_argument('--format', choices=PART_FORMATS, default='json', help='Formato dei file parziali')
+    parser.add_argument('--workers', type=int, default=None, help='Processi usati con --shards, di default uno per core')
+    args = parser.parse_args()
+
+    # Load environment variables from .env file
+    load_dotenv()
+
+    # Input paths can be s3:// URIs, read through the local cache
+    excel_path = os.getenv('EXCEL_PATH')
+    candidature_checklist = read_excel(excel_path)
+
+    # With the master list available, candidature without a PDF are written as 'Documento non presente'.
+    # The reports of the checks run by the scripts (CUP_REPORT_PATH, ...) are aligned the same way,
+    # check_status tells a skipped candidatura from one without its PDF
+    parquet_path = os.getenv('PARQUET_PATH')
+    check_reports = load_check_reports()
+    if parquet_path or check_reports:
+        master = read_parquet(parquet_path, columns=['Candidatura']) if parquet_path else candidature_checklist
+        reconciled = reconcile(master, {'Stato_Checklist_Asseverazione': candidature_checklist, **check_reports})
+        candidature_checklist = reconciled.reports['Stato_Checklist_Asseverazione']
+        for check in check_reports:
+            candidature_checklist[check] = check_status(reconciled, check, candidature_checklist.index)
+        candidature_checklist = candidature_checklist.reset_index()
+        print(f"Candidature senza documento: {len(reconciled.missing['Stato_Checklist_Asseverazione'])}, "
+              f"documenti orfani: {len(reconciled.orphans['Stato_Checklist_Asseverazione'])}")
+
+    os.makedirs(args.out, exist_ok=True)
+    write_json(build_candidature(candidature_checklist), os.path.join(args.out, 'candidature.json'))
+    if args.shards:
+        write_sharded(candidature_checklist, args.out, args.shards, args.format, args.workers)
+    else:
+        write_json(build_candidatura(candidature_checklist), os.path.join(args.out, 'candidatura.json'))
+
+    if is_remote(excel_path) or is_remote(parquet_path or ''):
+        stats = storage_stats()
+        print(f"S3: {stats['fetched']} byte scaricati, {stats['cached']} byte letti dalla cache locale")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import os
+import re
+import sys
+import argparse
+import pandas as pd
+from text_store import update_text_store, load_store, candidature_texts
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from storage import read_table
+
+# CUP: letter, two digits (year), letter (sector) and eleven digits, 15 characters in all
+CUP_PATTERN = re.compile(r'\b[A-Z]\d{2}[A-Z]\d{11}\b')
+
+def read_expected(path, cup_column='CUP'):
+    # Expected CUP per candidatura, from Parquet, Excel or CSV
+    expected = read_table(path, ['Candidatura', cup_column]).rename(columns={cup_column: 'CUP_atteso'})
+    expected['CUP_atteso'] = expected['CUP_atteso'].astype('string').str.strip().str.upper()
+    return expected.dropna().drop_duplicates('Candidatura', keep='last')
+
+def check_cup(texts, expected):
+    # texts: Candidatura, text, error (one row per PDF); expected: Candidatura, CUP_atteso
+    found = texts['text'].str.upper().str.findall(CUP_PATTERN)
+    codes = pd.DataFrame({'Candidatura': texts['Candidatura'], 'CUP': found}).explode('CUP').dropna().drop_duplicates()
+
+    candidature = pd.Index(texts['Candidatura'].unique(), name='Candidatura')
+    failed = (texts['error'] != '').groupby(texts['Candidatura']).all()
+    matched = codes.merge(expected, left_on=['Candidatura', 'CUP'], right_on=['Candidatura', 'CUP_atteso'])
+
+    # From the weakest to the strongest outcome, each assignment overrides the previous ones
+    status = pd.Series('Codice assente', index=candidature, name='Stato_CUP')
+    status[candidature.isin(codes['Candidatura'])] = 'Codice errato'
+    status[candidature.isin(matched['Candidatura'])] = 'Codice corretto'
+    status[~candidature.isin(expected['Candidatura'])] = 'Verifica manuale'
+    status[failed.reindex(candidature).to_numpy()] = 'Errore nel controllo'
+
+    report = status.reset_index()
+    report = report.merge(expected, on='Candidatura', how='left')
+    # Most candidature have a single code: only the others go through the (Python level) join
+    several = codes['Candidatura'].duplicated(keep=False).to_numpy()
+    found = pd.concat([
+        codes[~several].set_index('Candidatura')['CUP'],
+        codes[several].groupby('Candidatura')['CUP'].agg(', '.join),
+    ])
+    report['CUP_trovati'] = report['Candidatura'].map(found).fillna('')
+    return report[['Candidatura', 'Stato_CUP', 'CUP_atteso', 'CUP_trovati']]
+
+def main():
+    parser = argparse.ArgumentParser(description='Controllo del CUP nelle checklist di asseverazione')
+    parser.add_argument('pdf_dir', help='Cartella dei PDF, con il codice della candidatura nel nome del file')
+    parser.add_argument('expected', help='Parquet, Excel o CSV con le colonne Candidatura e CUP')
+    parser.add_argument('--cup-column', default='CUP')
+    parser.add_argument('--store', default='../data/text_store.parquet', help='Cache dei testi estratti')
+    parser.add_argument('--out', default='../data/cup_report.parquet')
+    parser.add_argument('--workers', type=int, default=None, help='Processi di estrazione, di default uno per core')
+    parser.add_argument('--skip-extraction', action='store_true', help='Usa solo i testi già nella cache')
+    args = parser.parse_args()
+
+    texts = load_store(args.store) if args.skip_extraction else update_text_store(args.pdf_dir, args.store, args.workers)
+    report = check_cup(candidature_texts(texts), read_expected(args.expected, args.cup_column))
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    report.to_parquet(args.out, index=False)
+    print(report['Stato_CUP'].value_counts().to_string())
+    print(f"Report written to {args.out}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from create_json_candidature import build_candidature, build_candidatura, write_json
+from reconciliation import reconcile
+
+# Building blocks of a candidatura ID such as 'CND_141SCU0422X_015254'
+MISURE = ['131', '141', '144']
+TIPI_ENTE = ['SCU', 'COM']
+AVVISI = ['0422', '0622', '1022', '1222']
+
+# (Status, Esito, probability) of the asseverazione report rows
+STATUS_ESITO_DISTRIBUTION = [
+    ('Firma presente',         'Positivo',               0.55),
+    ('Documento p7m',          'Positivo',               0.10),
+    ('Firma presente',         'Negativo',               0.04),
+    ('Firma presente',         'Campo nullo',            0.03),
+    ('Firma assente',          'Positivo',               0.07),
+    ('Verifica manuale',       'Positivo',               0.06),
+    ('EOF marker not found',   'EOF marker not found',   0.03),
+    ('Documento non presente', 'Documento non presente', 0.12),
+]
+
+def generate_candidature_ids(n, rng):
+    misura = rng.choice(MISURE, size=n, p=[0.3, 0.6, 0.1])
+    tipo_ente = rng.choice(TIPI_ENTE, size=n, p=[0.45, 0.55])
+    avviso = rng.choice(AVVISI, size=n)
+    # A permutation keeps the progressive numbers unique across the whole registry
+    progressivo = rng.permutation(max(n, 999999))[:n] + 1
+
+    ids = pd.Series(['CND_'] * n, dtype=object)
+    ids = ids + misura + tipo_ente + avviso + 'X_' + pd.Series(progressivo).map('{:06d}'.format)
+    return ids
+
+def generate_file_status_report(n, seed=42):
+    rng = np.random.default_rng(seed)
+    choices = rng.choice(len(STATUS_ESITO_DISTRIBUTION), size=n, p=[p for _, _, p in STATUS_ESITO_DISTRIBUTION])
+    status = np.array([s for s, _, _ in STATUS_ESITO_DISTRIBUTION], dtype=object)
+    esito = np.array([e for _, e, _ in STATUS_ESITO_DISTRIBUTION], dtype=object)
+
+    return pd.DataFrame({
+        'Candidatura': generate_candidature_ids(n, rng),
+        'Status': status[choices],
+        'Esito': esito[choices],
+    })
+
+def generate_candidature_checklist(file_status_report):
+    return file_status_report[['Candidatura']].copy()
+
+def drop_missing_documents(file_status_report, missing_rate, seed=42):
+    # Candidature without any PDF are in the master list but never reach the report
+    rng = np.random.default_rng(seed + 1)
+    return file_status_report[rng.random(len(file_status_report)) >= missing_rate].reset_index(drop=True)
+
+# (outcome, probability) of the CUP written in the checklist text
+CUP_DISTRIBUTION = [('corretto', 0.85), ('errato', 0.08), ('assente', 0.07)]
+
+def generate_cup(n, rng):
+    letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    digits = rng.integers(0, 10, size=(n, 13)).astype(str)
+    parts = [letters[rng.integers(0, 26, n)], digits[:, 0], digits[:, 1], letters[rng.integers(0, 26, n)]]
+    parts += [digits[:, i] for i in range(2, 13)]
+    return pd.Series([''.join(chars) for chars in zip(*parts)], dtype=object)
+
+def generate_expected_cup(candidature_checklist, seed=42):
+    rng = np.random.default_rng(seed + 2)
+    return pd.DataFrame({'Candidatura': candidature_checklist['Candidatura'], 'CUP': generate_cup(len(candidature_checklist), rng)})
+
+ENTITY_TYPES = ['Comune di', 'Unione dei Comuni', 'Provincia di', 'Istituto Comprensivo', 'Azienda Sanitaria Locale', 'Consorzio di Bonifica']
+SYLLABLES = ['ca', 'sa', 'no', 'ri', 'ta', 'ma', 'lo', 'ven', 'pe', 'to', 'ro', 'gna', 'scia', 'le', 'del', 'mon', 'fio', 'ra']
+
+# (outcome, probability) of the soggetto attuatore written in the checklist text
+SA_DISTRIBUTION = [('corretto', 0.8), ('nome_variato', 0.08), ('cf_errato', 0.05), ('solo_nome', 0.05), ('assente', 0.02)]
+
+def generate_registry(n=20000, seed=42):
+    # Registry of the soggetti attuatori: unique 11-digit fiscal codes and place-like names
+    rng = np.random.default_rng(seed + 4)
+    # Twice the names needed, so that n are left once the repeated ones are dropped
+    codici = rng.choice(10 ** 11, size=2 * n, replace=False)
+    syllables = np.array(SYLLABLES)
+    places = [''.join(syllables[rng.integers(0, len(syllables), k)]).capitalize() for k in rng.integers(3, 6, size=2 * n)]
+    kinds = np.array(ENTITY_TYPES)[rng.integers(0, len(ENTITY_TYPES), 2 * n)]
+    names = [f'{kind} {place}' for kind, place in zip(kinds, places)]
+    registry = pd.DataFrame({'Codice_fiscale': [f'{c:011d}' for c in codici], 'Denominazione': names})
+    return registry.drop_duplicates('Denominazione').head(n).reset_index(drop=True)
+
+def _vary_name(name, rng):
+    # Typing slip: one character dropped, as found in hand-filled checklists
+    i = int(rng.integers(1, len(name)))
+    return name[:i - 1] + name[i:]
+
+def generate_checklist_texts(expected_cup, registry=None, seed=42):
+    # Text of each checklist PDF, with the expected CUP, another one or none, and with a
+    # registry the soggetto attuatore, correct or with its name or fiscal code altered
+    rng = np.random.default_rng(seed + 3)
+    n = len(expected_cup)
+    outcomes = rng.choice([o for o, _ in CUP_DISTRIBUTION], size=n, p=[p for _, p in CUP_DISTRIBUTION])
+    wrong = generate_cup(n, rng)
+    cup = np.where(outcomes == 'corretto', expected_cup['CUP'], wrong)
+    sa = [''] * n
+    if registry is not None:
+        entities = registry.iloc[rng.integers(0, len(registry), n)]
+        sa_outcomes = rng.choice([o for o, _ in SA_DISTRIBUTION], size=n, p=[p for _, p in SA_DISTRIBUTION])
+        for i, (codice, name, outcome) in enumerate(zip(entities['Codice_fiscale'], entities['Denominazione'], sa_outcomes)):
+            if outcome == 'nome_variato':
+                name = _vary_name(name, rng)
+            elif outcome == 'cf_errato':
+                codice = f'{int(rng.integers(0, 10 ** 11)):011d}'
+            if outcome == 'solo_nome':
+                sa[i] = f'Soggetto attuatore: {name}\n'
+            elif outcome != 'assente':
+                sa[i] = f'Soggetto attuatore: {name} - C.F. {codice}\n'
+    texts = [
+        f"Checklist di asseverazione\nCandidatura {candidatura}\n" + (f"CUP: {code}\n" if outcome != 'assente' else '') + entity + 'Il sottoscritto attesta ...'
+        for candidatura, code, outcome, entity in zip(expected_cup['Candidatura'], cup, outcomes, sa)
+    ]
+    return pd.DataFrame({'Candidatura': expected_cup['Candidatura'], 'text': texts, 'error': ''})
+
+def write_dataset(n, out_dir, seed=42, date='20240805', formats=('parquet', 'excel', 'json'), missing_rate=0.0):
+    os.makedirs(out_dir, exist_ok=True)
+    file_status_report = generate_file_status_report(n, seed)
+    candidature_checklist = generate_candidature_checklist(file_status_report)
+    file_status_report = drop_missing_documents(file_status_report, missing_rate, seed)
+
+    paths = {}
+    if 'parquet' in formats:
+        paths['parquet'] = os.path.join(out_dir, f'{date}_candidature_checklist.parquet')
+        candidature_checklist.to_parquet(paths['parquet'], index=False)
+    if 'excel' in formats:
+        paths['excel'] = os.path.join(out_dir, f'{date}_file_status_report_all.xlsx')
+        file_status_report.to_excel(paths['excel'], index=False)
+    if 'json' in formats:
+        paths['candidature'] = os.path.join(out_dir, 'candidature.json')
+        paths['candidatura'] = os.path.join(out_dir, 'candidatura.json')
+        # Same as create_json_candidature.py with PARQUET_PATH set
+        reconciled = reconcile(candidature_checklist, {'Stato_Checklist_Asseverazione': file_status_report})
+        report = reconciled.reports['Stato_Checklist_Asseverazione'].reset_index()
+        write_json(build_candidature(report), paths['candidature'])
+        write_json(build_candidatura(report), paths['candidatura'])
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera dati sintetici per i controlli formali')
+    parser.add_argument('--n', type=int, default=10000, help='Numero di candidature')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--date', default='20240805', help='Data usata nel nome dei file di input')
+    parser.add_argument('--out', default='../data/synthetic')
+    parser.add_argument('--formats', default='parquet,excel,json')
+    parser.add_argument('--missing-rate', type=float, default=0.0, help='Quota di candidature senza documenti nel report')
+    args = parser.parse_args()
+
+    paths = write_dataset(args.n, args.out, args.seed, args.date, args.formats.split(','), args.missing_rate)
+    for kind, path in paths.items():
+        print(f"{kind}: {path}")
+
+if __name__ == '__main__':
+    main()
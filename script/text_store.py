@@ -0,0 +1,95 @@
+import os
+import re
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Text of every PDF, extracted once and kept until the file changes size or mtime.
+# Failed extractions are retried at every run, the error may come from the environment
+STORE_SCHEMA = pa.schema([
+    ('path', pa.string()),
+    ('size', pa.int64()),
+    ('mtime_ns', pa.int64()),
+    ('text', pa.large_string()),
+    ('error', pa.string()),
+])
+
+# PDFs are named after their candidatura, e.g. 'CND_141SCU0422X_015254_checklist.pdf'
+CANDIDATURA_PATTERN = re.compile(r'(CND_[0-9A-Z]+_\d{6})')
+
+def _extract_pdfplumber(path):
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return '\n'.join(page.extract_text() or '' for page in pdf.pages)
+
+def _extract_pymupdf(path):
+    import pymupdf
+    with pymupdf.open(path) as document:
+        return '\n'.join(page.get_text() for page in document)
+
+def extract_text(path):
+    # pdfplumber first, PyMuPDF for the files it cannot read
+    errors = []
+    for extract in (_extract_pdfplumber, _extract_pymupdf):
+        try:
+            return extract(path), ''
+        except Exception as e:
+            errors.append(f'{extract.__name__.removeprefix("_extract_")}: {e}')
+    return '', '; '.join(errors)
+
+def list_pdfs(pdf_dir):
+    rows = []
+    for dirpath, _, filenames in os.walk(pdf_dir):
+        for filename in filenames:
+            if filename.lower().endswith('.pdf'):
+                path = os.path.join(dirpath, filename)
+                stat = os.stat(path)
+                rows.append((path, stat.st_size, stat.st_mtime_ns))
+    return pd.DataFrame(sorted(rows), columns=['path', 'size', 'mtime_ns'])
+
+def load_store(store_path):
+    if not os.path.exists(store_path):
+        return STORE_SCHEMA.empty_table().to_pandas()
+    return pq.read_table(store_path, schema=STORE_SCHEMA).to_pandas()
+
+def update_text_store(pdf_dir, store_path, workers=None):
+    files = list_pdfs(pdf_dir)
+    store = load_store(store_path)
+    merged = files.merge(store, on=['path', 'size', 'mtime_ns'], how='left', indicator=True)
+    failed = (merged['error'].fillna('') != '').to_numpy()
+    todo = (merged.pop('_merge') == 'left_only').to_numpy() | failed
+
+    # Only new or changed PDFs and the ones that failed last time are extracted, across all cores
+    paths = merged.loc[todo, 'path'].tolist()
+    if paths:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(extract_text, paths, chunksize=8))
+        merged.loc[todo, 'text'] = [text for text, _ in results]
+        merged.loc[todo, 'error'] = [error for _, error in results]
+
+    # Files removed from pdf_dir drop out of the store
+    os.makedirs(os.path.dirname(os.path.abspath(store_path)), exist_ok=True)
+    tmp_path = f'{store_path}.tmp'
+    pq.write_table(pa.Table.from_pandas(merged, schema=STORE_SCHEMA, preserve_index=False), tmp_path, compression='zstd')
+    os.replace(tmp_path, store_path)
+    print(f"Testi: {len(paths)} PDF estratti ({failed.sum()} dopo un errore), {len(merged) - len(paths)} dalla cache")
+    return merged
+
+def candidature_texts(texts):
+    # path, text, error -> Candidatura, text, error, for the PDFs named after a candidatura
+    candidature = texts['path'].map(os.path.basename).str.extract(CANDIDATURA_PATTERN, expand=False)
+    texts = texts.assign(Candidatura=candidature).dropna(subset=['Candidatura'])
+    return texts[['Candidatura', 'text', 'error']].reset_index(drop=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Estrae il testo dei PDF nella cache dei testi')
+    parser.add_argument('pdf_dir')
+    parser.add_argument('--store', default='../data/text_store.parquet')
+    parser.add_argument('--workers', type=int, default=None, help='Processi di estrazione, di default uno per core')
+    args = parser.parse_args()
+    update_text_store(args.pdf_dir, args.store, args.workers)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import numpy as np
+
+# Severity levels, from a passed check to a missing document
+OK, NON_SUPPORTATO, ERRORE_CONTROLLO, ERRATO, MANCANTE = range(5)
+
+# Every status label shown by the frontends with its background colour and severity
+STATUSES = {
+    'Documento valido':         ('lightgreen', OK),
+    'Codice corretto':          ('lightgreen', OK),
+    'Firma presente':           ('lightgreen', OK),
+    'Documento p7m':            ('lightgreen', OK),
+    'Dati corretti':            ('lightgreen', OK),
+    'Compilazione corretta':    ('lightgreen', OK),
+    'Positivo':                 ('lightgreen', OK),
+    'Documento non supportato': ('blue',       NON_SUPPORTATO),
+    'Controllo non supportato': ('blue',       NON_SUPPORTATO),
+    'Errore nel controllo':     ('yellow',     ERRORE_CONTROLLO),
+    'Errori nei controlli':     ('yellow',     ERRORE_CONTROLLO),
+    'Documento errato':         ('orange',     ERRATO),
+    'Codice errato':            ('orange',     ERRATO),
+    'Verifica manuale':         ('orange',     ERRATO),
+    'Dati non corrispondenti':  ('orange',     ERRATO),
+    'Compilazione errata':      ('orange',     ERRATO),
+    'Negativo':                 ('orange',     ERRATO),
+    'Documento non presente':   ('red',        MANCANTE),
+    'Codice assente':           ('red',        MANCANTE),
+    'Firma assente':            ('red',        MANCANTE),
+    'Campo nullo':              ('red',        MANCANTE),
+}
+
+# Raw values of the file status report that stand for a vocabulary label
+ALIASES = {
+    'EOF marker not found': 'Errore nel controllo',
+}
+
+DEFAULT_COLOR = 'white'
+
+STATUS_COLORS = {label: color for label, (color, _) in STATUSES.items()}
+STATUS_COLORS.update({alias: STATUS_COLORS[label] for alias, label in ALIASES.items()})
+STATUS_SEVERITY = {label: severity for label, (_, severity) in STATUSES.items()}
+STATUS_SEVERITY.update({alias: STATUS_SEVERITY[label] for alias, label in ALIASES.items()})
+
+STATI_DOCUMENTO = ['Documento valido', 'Documento non presente', 'Documento errato', 'Documento non supportato', 'Errori nei controlli']
+
+POSSIBLE_VALUES_DOCUMENTI = {
+    "Stato_Contratto_SA_SR":                                STATI_DOCUMENTO,
+    "Stato_Determina_Affidamento_Aggiudicazione_Servizio":  STATI_DOCUMENTO,
+    "Stato_Proposta_Commerciale":                           STATI_DOCUMENTO,
+    "Stato_Documento_Stipula_MEPA":                         STATI_DOCUMENTO,
+    "Stato_Convenzione_Accordo":                            STATI_DOCUMENTO,
+    "Stato_Checklist_Asseverazione":                        STATI_DOCUMENTO,
+    "Stato_Certificato_Regolare_Esec":                      STATI_DOCUMENTO,
+    "Stato_Allegato_5":                                     STATI_DOCUMENTO,
+}
+
+POSSIBLE_VALUES_CHECKLIST = {
+    "Stato_CUP":                    ['Codice corretto',                     'Codice errato', 'Codice assente',      'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
+    "Stato_Firma_Asseveratore":     ['Firma presente', 'Documento p7m',     'Firma assente',                        'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
+    "Stato_Anagrafica_SA":          ['Dati corretti',                       'Dati non corrispondenti',              'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
+    "Stato_Compilazione_Checklist": ['Compilazione corretta',               'Compilazione errata',                  'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente'],
+    "Esito_Conformità_Tecnica":     ['Positivo',                            'Negativo', 'Campo nullo',              'Verifica manuale', 'Controllo non supportato', 'Errore nel controllo', 'Documento non presente']
+}
+
+# Category codes index this array; code -1 (unknown value) picks the trailing default
+_LABELS = list(STATUS_COLORS)
+_CSS = np.array([f'background-color: {STATUS_COLORS[label]}' for label in _LABELS] + [f'background-color: {DEFAULT_COLOR}'])
+
+def status_css(column):
+    # Imported here so the backend can use the vocabulary without loading pandas
+    import pandas as pd
+    codes = pd.Categorical(column, categories=_LABELS).codes
+    return _CSS[codes]
+
+def style_statuses(df):
+    # One categorical lookup per column instead of one Python call per cell
+    return df.style.apply(status_css, axis=0)
+
+def vocabulary():
+    return [
+        {'label': label, 'color': STATUS_COLORS[label], 'severity': STATUS_SEVERITY[label], 'alias_of': ALIASES.get(label)}
+        for label in _LABELS
+    ]
@@ -0,0 +1,164 @@
+import io
+import os
+import json
+import time
+import fcntl
+import hashlib
+import threading
+import pyarrow.parquet as pq
+
+# Inputs can be local paths or s3:// URIs. Whole-file reads (Excel, JSON) go through a
+# local disk cache revalidated against the object's ETag; Parquet is read in place with
+# byte-range requests, so only the row groups and columns asked for are downloaded.
+S3_SCHEME = 's3://'
+
+def is_remote(path):
+    return str(path).startswith(S3_SCHEME)
+
+def cache_dir():
+    return os.getenv('STORAGE_CACHE_DIR', '.storage_cache')
+
+def revalidate_seconds():
+    # Within this window a cached object is used without asking S3 for its ETag again
+    return float(os.getenv('STORAGE_REVALIDATE_SECONDS', '30'))
+
+_fs = None
+_fs_lock = threading.Lock()
+
+def get_filesystem():
+    global _fs
+    with _fs_lock:
+        if _fs is None:
+            # s3fs is only needed for s3:// paths; S3_ENDPOINT_URL points it at MinIO or moto
+            import s3fs
+            endpoint_url = os.getenv('S3_ENDPOINT_URL')
+            # No listings cache: after any listing s3fs would keep answering info() and open()
+            # with the size and ETag of that moment, hiding new or changed objects
+            _fs = s3fs.S3FileSystem(client_kwargs={'endpoint_url': endpoint_url} if endpoint_url else {}, use_listings_cache=False)
+        return _fs
+
+# Bytes downloaded from S3 and bytes served from the local cache instead of downloading
+_stats = {'fetched': 0, 'cached': 0}
+_stats_lock = threading.Lock()
+_listeners = []
+
+def add_listener(callback):
+    # callback(kind, nbytes) with kind 'fetched' or 'cached', e.g. to feed the backend metrics
+    _listeners.append(callback)
+
+def _record(kind, nbytes):
+    with _stats_lock:
+        _stats[kind] += nbytes
+    for callback in _listeners:
+        callback(kind, nbytes)
+
+def storage_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+def _cache_path(uri, relative_path=None):
+    # One directory per object (or per manifest, whose parts keep their relative layout)
+    key = hashlib.sha256(uri.encode('utf-8')).hexdigest()[:32]
+    return os.path.join(cache_dir(), key, relative_path or os.path.basename(uri))
+
+def _read_etag(path):
+    try:
+        with open(f'{path}.etag', 'r') as etag_file:
+            return etag_file.read()
+    except FileNotFoundError:
+        return None
+
+# uri -> (time of the last ETag check, local path)
+_validated = {}
+
+def _fetch(uri, path):
+    fs = get_filesystem()
+    info = fs.info(uri)
+    etag = str(info.get('ETag', '')).strip('"')
+    if etag and _read_etag(path) == etag and os.path.exists(path):
+        _record('cached', info['size'])
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # One process downloads, the others wait and find the copy up to date
+    with open(f'{path}.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if not (etag and _read_etag(path) == etag and os.path.exists(path)):
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                fs.get_file(uri, tmp_path)
+                os.replace(tmp_path, path)
+                with open(f'{path}.etag', 'w') as etag_file:
+                    etag_file.write(etag)
+                _record('fetched', info['size'])
+            else:
+                _record('cached', info['size'])
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return path
+
+def local_path(path, cache_path=None):
+    # Local file with the content of path: the path itself, or the cached copy of an S3 object
+    if not is_remote(path):
+        return path
+    validated = _validated.get(path)
+    if validated is not None and time.monotonic() - validated[0] < revalidate_seconds():
+        return validated[1]
+
+    local = _fetch(path, cache_path or _cache_path(path))
+    if path.endswith('.manifest.json'):
+        # The parts of a sharded dataset are cached next to the manifest, as they are in the bucket
+        with open(local, 'r', encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+        base_uri = path.rsplit('/', 1)[0]
+        for part in manifest['parts']:
+            _fetch(f"{base_uri}/{part['path']}", os.path.join(os.path.dirname(local), part['path']))
+    _validated[path] = (time.monotonic(), local)
+    return local
+
+# File object counting the bytes that the Parquet reader actually downloads
+class _CountingFile(io.RawIOBase):
+    def __init__(self, remote_file):
+        self.remote_file = remote_file
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.remote_file.seek(offset, whence)
+
+    def tell(self):
+        return self.remote_file.tell()
+
+    def readinto(self, buffer):
+        data = self.remote_file.read(len(buffer))
+        buffer[:len(data)] = data
+        _record('fetched', len(data))
+        return len(data)
+
+    def close(self):
+        self.remote_file.close()
+        super().close()
+
+def read_parquet(path, columns=None, filters=None):
+    if not is_remote(path):
+        return pq.read_table(path, columns=columns, filters=filters).to_pandas()
+    # No read-ahead cache: every read is a range request for what the footer says is needed
+    with get_filesystem().open(path, 'rb', cache_type='none') as remote_file:
+        return pq.read_table(_CountingFile(remote_file), columns=columns, filters=filters).to_pandas()
+
+def read_excel(path, **kwargs):
+    import pandas as pd
+    return pd.read_excel(local_path(path), **kwargs)
+
+def read_table(path, columns):
+    # Columns of a Parquet, Excel or CSV file, chosen by extension
+    import pandas as pd
+    if path.endswith('.parquet'):
+        return read_parquet(path, columns=columns)
+    if path.endswith(('.xlsx', '.xls')):
+        return read_excel(path, usecols=columns)
+    return pd.read_csv(local_path(path), usecols=columns)
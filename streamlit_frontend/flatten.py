@@ -0,0 +1,20 @@
+import pandas as pd
+import streamlit as st
+
+def flatten_documents(query_data):
+    # Status of each document, indexed by documentClass
+    df_documents = pd.DataFrame(query_data, columns=['documentClass', 'esitoCheckReason']).set_index('documentClass')
+
+    # All dettaglioCheck entries of every document class in a single normalisation pass
+    checks = pd.json_normalize(query_data, record_path='dettaglioCheck', meta=['documentClass'])
+    details = {}
+    if not checks.empty:
+        for document_class, df_checks in checks.groupby('documentClass', sort=False):
+            details[document_class] = df_checks.set_index('nomeCheck')[['Descrizione']]
+    return df_documents, details
+
+# Flattened candidature kept across reruns, keyed by (candidatureId, dataset version):
+# the leading underscore keeps the documents themselves out of the cache key
+@st.cache_data(max_entries=256)
+def get_flattened(candidature_id, version, _query_data):
+    return flatten_documents(_query_data)
@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import requests
+from urllib.parse import urlencode
+import pandas as pd
+import streamlit as st
+from st_aggrid import AgGrid, GridOptionsBuilder, JsCode
+from dotenv import load_dotenv
+
+# The status vocabulary is shared with the backend from the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from status_vocabulary import STATUS_COLORS, STATI_DOCUMENTO, DEFAULT_COLOR
+
+# Load environment variables from .env file
+load_dotenv()
+
+cell_style = JsCode(f"""
+function(params) {{
+    const colors = {json.dumps(STATUS_COLORS)};
+    return {{'backgroundColor': colors[params.value] || '{DEFAULT_COLOR}'}};
+}}
+""")
+
+@st.cache_data(ttl=60)  # Set time to live
+def fetch_matrix(params):
+    api_url = os.getenv('API_URL')+'matrix'
+    response = requests.get(api_url, params=dict(params))
+    if response.status_code == 200:
+        return response.json()
+    else:
+        st.error('Failed to fetch data from backend')
+        return None
+
+if not st.session_state.get("authentication_status"):
+    st.warning('Please enter your username and password')
+    st.stop()
+
+st.title('Matrice completa dei controlli')
+
+st.sidebar.title("Filtri")
+prefix = st.sidebar.text_input('Candidatura che inizia con')
+page_size = st.sidebar.selectbox('Righe per pagina', [100, 500, 1000, 5000], index=2)
+
+# The first request only tells which columns exist and how many rows there are
+first_page = fetch_matrix((('limit', 1),))
+if first_page is not None:
+    document_columns = first_page['columns'][1:]
+    sort = st.sidebar.selectbox('Ordina per', first_page['columns'])
+    order = st.sidebar.radio('Ordine', ['asc', 'desc'], horizontal=True)
+    filters = {}
+    for column in document_columns:
+        selected = st.sidebar.multiselect(column, STATI_DOCUMENTO)
+        if selected:
+            filters[column] = ','.join(selected)
+
+    params = {'sort': sort, 'order': order, 'limit': page_size, **filters}
+    if prefix:
+        params['q'] = prefix
+
+    # fetch_matrix has already shown the error when the backend fails
+    count = fetch_matrix(tuple(sorted({**params, 'limit': 1}.items())))
+    if count is None:
+        st.stop()
+    total = count['total']
+    pages = max(1, -(-total // page_size))
+    page_number = st.number_input(f'Pagina (di {pages})', min_value=1, max_value=pages, value=1)
+    params['offset'] = (page_number - 1) * page_size
+
+    data = fetch_matrix(tuple(sorted(params.items())))
+    if data is None:
+        st.stop()
+    st.write(f"{data['total']} candidature")
+
+    # The browser downloads straight from the backend, which streams the whole filtered matrix
+    export_url = os.getenv('PUBLIC_API_URL', os.getenv('API_URL')) + 'export'
+    export_params = {key: value for key, value in params.items() if key not in ('limit', 'offset')}
+    for column, (label, export_format) in zip(st.columns(3), [('Scarica CSV', 'csv'), ('Scarica Excel', 'xlsx'), ('Scarica Parquet', 'parquet')]):
+        column.link_button(label, f"{export_url}?{urlencode({**export_params, 'format': export_format})}")
+    df = pd.DataFrame(data['rows'], columns=data['columns'])
+
+    # Sorting and filtering are delegated to the backend, the grid only renders the visible rows
+    builder = GridOptionsBuilder.from_dataframe(df)
+    builder.configure_default_column(sortable=False, filter=False, resizable=True, cellStyle=cell_style)
+    builder.configure_column('candidatureId', pinned='left', cellStyle=None)
+    AgGrid(df, gridOptions=builder.build(), height=600, allow_unsafe_jscode=True, fit_columns_on_grid_load=False)
@@ -1,4 +1,5 @@
 import os
+import sys
 import yaml
 import streamlit as st
 from yaml.loader import SafeLoader
@@ -7,23 +8,13 @@ import requests
 import pandas as pd
 from dotenv import load_dotenv
 
+# The status vocabulary is shared with the backend from the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from status_vocabulary import style_statuses
+
 # Load environment variables from .env file
 load_dotenv()
 
-def color_cells(val):
-    color = 'white'
-    if val in ['Documento non supportato', 'Controllo non supportato']:
-        color = 'blue'
-    elif val in ['Documento valido', 'Codice corretto', 'Firma presente', 'Documento p7m', 'Dati corretti', 'Compilazione corretta', 'Positivo']:
-        color = 'lightgreen'
-    elif val in ['Documento errato', 'Codice errato', 'Verifica manuale', 'Dati non corrispondenti', 'Compilazione errata', 'Negativo']:
-        color = 'orange'
-    elif val in ['Errore nel controllo', 'Errori nei controlli']:
-        color = 'yellow'
-    elif val in ['Documento non presente', 'Codice assente', 'Firma assente', 'Campo nullo']:
-        color = 'red'
-    return f'background-color: {color}'
-
 # Load config file
 config_path = os.getenv('CONFIG_PATH', 'config.yaml')
 with open(config_path, 'r', encoding='utf-8') as file:
@@ -79,14 +70,14 @@ if st.session_state["authentication_status"]:
         if selected_candidatura:
             if selected_candidatura in df.index:
                 st.write(f"Dettagli per la candidatura '{selected_candidatura}':")
-                st.dataframe(df.loc[[selected_candidatura]].T.style.applymap(color_cells))
+                st.dataframe(style_statuses(df.loc[[selected_candidatura]].T))
                 document_options = df.columns.tolist()
                 selected_document = st.sidebar.selectbox('Seleziona il documento', [''] + document_options)
 
                 if selected_document:
                     if selected_document == 'Stato_Checklist_Asseverazione':
                         st.write(f"Dettagli dei controlli per il documento '{selected_document}':")
-                        st.dataframe(df_checklist.loc[selected_candidatura, :].to_frame().style.applymap(color_cells))
+                        st.dataframe(style_statuses(df_checklist.loc[selected_candidatura, :].to_frame()))
                     else:
                         st.write(f"Documento non ancora supportato")            
             else:
@@ -1,4 +1,5 @@
 import os
+import sys
 import yaml
 import streamlit as st
 from yaml.loader import SafeLoader
@@ -7,23 +8,14 @@ import requests
 import pandas as pd
 from dotenv import load_dotenv
 
+# The status vocabulary is shared with the backend from the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from status_vocabulary import style_statuses
+from flatten import get_flattened
+
 # Load environment variables from .env file
 load_dotenv()
 
-def color_cells(val):
-    color = 'white'
-    if val in ['Documento non supportato', 'Controllo non supportato']:
-        color = 'blue'
-    elif val in ['Documento valido', 'Codice corretto', 'Firma presente', 'Documento p7m', 'Dati corretti', 'Compilazione corretta', 'Positivo']:
-        color = 'lightgreen'
-    elif val in ['Documento errato', 'Codice errato', 'Verifica manuale', 'Dati non corrispondenti', 'Compilazione errata', 'Negativo']:
-        color = 'orange'
-    elif val in ['Errore nel controllo', 'Errori nei controlli', 'EOF marker not found']:
-        color = 'yellow'
-    elif val in ['Documento non presente', 'Codice assente', 'Firma assente', 'Campo nullo']:
-        color = 'red'
-    return f'background-color: {color}'
-
 @st.cache_data(ttl=3600)  # Set Time to live
 def fetch_data():
     api_url = os.getenv('API_URL')+'data'
@@ -32,7 +24,8 @@ def fetch_data():
         data = response.json()
         # Convert the JSON data to a DataFrame
         df = pd.DataFrame(data)
-        candidatura_options = df['candidature_ids'].unique()
+        # A set keeps the membership test on the searched candidatura O(1)
+        candidatura_options = set(df['candidature_ids'].unique())
         return candidatura_options
     else:
         st.error('Failed to fetch data from backend')
@@ -45,54 +38,32 @@ def fetch_data2(id_candidatura):
     if response.status_code == 200:
         data = response.json()
 
-        # Extract the query data
-        query_data = data['query']
-
-        return query_data
+        # Extract the query data and the dataset version it comes from
+        return data['query'], data['version']
     else:
         st.error('Failed to fetch data from backend')
-        return None
-
-def prepro(query_data):
-    # Extract relevant information for the DataFrame
-    records = []
-    for entry in query_data:
-        records.append({
-            'documentClass': entry['documentClass'],
-            'candidatureId': entry['candidatureId'],
-            'esitoCheckReason': entry['esitoCheckReason']
-        })
-
-    # Create a DataFrame
-    df_documents = pd.DataFrame(records)
-
-    # Set 'documentClass' as the index
-    df_documents.set_index('documentClass', inplace=True)
-
-    # Select only the 'candidatureId' and 'esitoCheckReason' columns
-    df_documents = df_documents[['esitoCheckReason']]
+        return None, None
 
-    # Find the document with documentClass "Stato_Checklist_Asseverazione"
-    checklist_document = next(doc for doc in query_data if doc['documentClass'] == "Stato_Checklist_Asseverazione")
-
-    # Extract relevant information for the DataFrame
-    records = []
-    for check in checklist_document['dettaglioCheck']:
-        records.append({
-            'nomeCheck': check['nomeCheck'],
-            'candidatureId': checklist_document['candidatureId'],
-            'Descrizione': check['Descrizione']
-        })
-
-    # Create a DataFrame
-    df_checklist = pd.DataFrame(records)
+def fetch_lavorata(id_candidatura):
+    # Not cached, so a candidatura saved by another reviewer disappears right away;
+    # only the searched candidatura is asked for, not the whole list
+    api_url = os.getenv('API_URL')+'lavorate/'+id_candidatura
+    response = requests.get(api_url)
+    if response.status_code == 200:
+        return response.json()['lavorata']
+    else:
+        st.error('Failed to fetch processed candidature from backend')
+        return False
 
-    # Set 'nomeCheck' as the index
-    df_checklist.set_index('nomeCheck', inplace=True)
+def save_lavorata(id_candidatura, username):
+    api_url = os.getenv('API_URL')+'lavorate'
+    response = requests.post(api_url, json={'candidatureId': id_candidatura, 'username': username})
+    return response.status_code in (200, 201)
 
-    # Select only the 'candidatureId' and 'Descrizione' columns
-    df_checklist = df_checklist[['Descrizione']]
-    return df_documents, df_checklist
+def save_feedback(id_candidatura, document_class, user_feedback, username):
+    api_url = os.getenv('API_URL')+'detail/'+id_candidatura+'/'+document_class
+    response = requests.patch(api_url, json={'userFeedback': user_feedback, 'username': username})
+    return response.status_code == 200
 
 # Load config file
 config_path = os.getenv('CONFIG_PATH', 'config.yaml')
@@ -132,22 +103,48 @@ if st.session_state["authentication_status"]:
         st.sidebar.title("Ricerca Candidature")
         selected_candidatura = st.sidebar.text_input('Cerca il nome della candidatura')
 
+        # Set before the rerun that follows a save, shown once on the next run
+        saved_candidatura = st.session_state.pop('saved_lavorata', None)
+        if saved_candidatura:
+            st.success(f"La candidatura '{saved_candidatura}' è stata salvata e non verrà più presentata!")
+
         if selected_candidatura:
-            if selected_candidatura in candidatura_options:
+            if fetch_lavorata(selected_candidatura):
+                st.write(f"La candidatura '{selected_candidatura}' è già stata lavorata")
+            elif selected_candidatura in candidatura_options:
                 st.write(f"Dettagli per la candidatura '{selected_candidatura}':")
-                query_data = fetch_data2(selected_candidatura)
+                query_data, version = fetch_data2(selected_candidatura)
+                if query_data is None:
+                    st.stop()
 
-                ### preprocessing 
-                df_documents, df_checklist = prepro(query_data)
+                ### preprocessing, memoized per candidatura and dataset version
+                df_documents, details = get_flattened(selected_candidatura, version, query_data)
 
-                st.dataframe(df_documents.style.applymap(color_cells))
+                st.dataframe(style_statuses(df_documents))
                 document_options = df_documents.index.tolist()
                 selected_document = st.sidebar.selectbox('Seleziona il documento', [''] + document_options)
 
+                if st.sidebar.button('Salva come candidatura lavorata'):
+                    if save_lavorata(selected_candidatura, st.session_state["username"]):
+                        st.session_state['saved_lavorata'] = selected_candidatura
+                        st.rerun()
+                    else:
+                        st.error('Failed to save the candidatura on the backend')
+
                 if selected_document:
-                    if selected_document == 'Stato_Checklist_Asseverazione':
+                    document = next(doc for doc in query_data if doc['documentClass'] == selected_document)
+                    user_feedback = st.text_area('Note sul documento', value=document['userFeedback'])
+                    if st.button('Salva nota'):
+                        if save_feedback(selected_candidatura, selected_document, user_feedback, st.session_state["username"]):
+                            # The cached detail would still show the previous note
+                            fetch_data2.clear()
+                            st.success('Nota salvata')
+                        else:
+                            st.error('Failed to save the note on the backend')
+
+                    if selected_document in details:
                         st.write(f"Dettagli dei controlli per il documento '{selected_document}':")
-                        st.dataframe(df_checklist.style.applymap(color_cells))
+                        st.dataframe(style_statuses(details[selected_document]))
                     else:
                         st.write(f"Documento non ancora supportato")            
             else:
@@ -0,0 +1,36 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# The backends, the scripts and the frontends import their modules from their own directory
+for directory in ('', 'flask_backend', 'script', 'streamlit_frontend'):
+    path = os.path.abspath(os.path.join(ROOT, directory))
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# No warm-up thread loading data at import time
+os.environ.setdefault('WARM_UP', '0')
+
+@pytest.fixture
+def store_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'controlli.db')
+    monkeypatch.setenv('STORE_PATH', path)
+    monkeypatch.setenv('FEEDBACK_LOG_DIR', str(tmp_path / 'feedback_log'))
+    return path
+
+@pytest.fixture(scope='session')
+def dataset(tmp_path_factory):
+    from synthetic_data import write_dataset
+    return write_dataset(2000, str(tmp_path_factory.mktemp('data')), seed=7)
+
+@pytest.fixture
+def client(dataset, store_path, monkeypatch):
+    # app_v2 on the synthetic dataset; its caches are keyed by the source file version
+    monkeypatch.setenv('PARQUET_PATH', dataset['parquet'])
+    monkeypatch.setenv('EXCEL_PATH', dataset['excel'])
+    monkeypatch.setenv('CANDIDATURE_PATH', dataset['candidature'])
+    monkeypatch.setenv('CANDIDATURA_PATH', dataset['candidatura'])
+    monkeypatch.delenv('SHARED_DATASET_PATH', raising=False)
+    import app_v2
+    return app_v2.app.test_client()
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+from synthetic_data import generate_registry, _vary_name
+from anagrafica_sa import RegistryIndex, normalize_name, trigrams, check_anagrafica
+
+@pytest.fixture(scope='module')
+def registry():
+    return generate_registry(5000, seed=11)
+
+@pytest.fixture
+def index(registry):
+    return RegistryIndex(registry['Codice_fiscale'], registry['Denominazione'])
+
+def misspelt_names(registry, n=200):
+    rng = np.random.default_rng(5)
+    sample = registry.sample(n, random_state=5)
+    return sample.index.to_numpy(), [normalize_name(_vary_name(name, rng)) for name in sample['Denominazione']]
+
+def test_fuzzy_match_finds_the_closest_entity(registry, index):
+    _, names = misspelt_names(registry)
+    rows, scores = index.match_names(names)
+
+    # Brute force: Jaccard of every name with every entity of the registry
+    registered = [trigrams(name) for name in index.names]
+    best = np.array([max(len(name & entity) / len(name | entity) for entity in registered)
+                     for name in map(trigrams, names)])
+    assert (rows >= 0).all()
+    assert np.isclose(scores, best).mean() >= 0.99
+    assert np.allclose(scores, [index._jaccard(trigrams(name), row) for name, row in zip(names, rows)])
+
+class CountingPostings(np.ndarray):
+    gathered = 0
+
+    def __getitem__(self, key):
+        result = super().__getitem__(key)
+        CountingPostings.gathered += np.size(result)
+        return result.view(np.ndarray)
+
+def test_fuzzy_match_never_scans_the_whole_registry(registry, index):
+    _, names = misspelt_names(registry)
+    index.postings = index.postings.view(CountingPostings)
+    gathered = []
+    for name in names:
+        CountingPostings.gathered = 0
+        index.match_names([name])
+        gathered.append(CountingPostings.gathered)
+    assert max(gathered) < len(index)
+    assert np.mean(gathered) < len(index) / 5
+
+def test_check_anagrafica_statuses(registry, index):
+    codice, name = registry['Codice_fiscale'].iloc[0], registry['Denominazione'].iloc[0]
+    other = registry['Denominazione'].iloc[1]
+    texts = pd.DataFrame({
+        'Candidatura': ['A', 'B', 'C', 'D', 'E'],
+        'text': [f'Soggetto attuatore: {name}\nCodice fiscale: {codice}',
+                 f'Soggetto attuatore: {other}\nCodice fiscale: {codice}',
+                 f'Soggetto attuatore: {name[:-1]}',
+                 'Nessun dato',
+                 ''],
+        'error': ['', '', '', '', 'pdfplumber: broken'],
+    })
+    report = check_anagrafica(texts, index)
+    assert report['Stato_Anagrafica_SA'].tolist() == [
+        'Dati corretti', 'Dati non corrispondenti', 'Verifica manuale', 'Verifica manuale', 'Errore nel controllo']
+    # The name alone finds the entity, reported as a suggestion
+    assert report.loc[2, 'CF_anagrafica'] == codice
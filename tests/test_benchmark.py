@@ -0,0 +1,46 @@
+import os
+import json
+import sys
+import subprocess
+from benchmark import compare, measure, BASELINE_PATH, STAGES, PER_WORKERS, ChildRun, stage_key, worker_counts
+
+BASELINE = {'api_data@10000': {'time_s': 1.0, 'peak_mb': 10.0}}
+
+def test_within_tolerance():
+    assert compare({'api_data@10000': {'time_s': 1.1, 'peak_mb': 12.0}}, BASELINE, 0.2) == []
+
+def test_regression():
+    regressions = compare({'api_data@10000': {'time_s': 1.5, 'peak_mb': 10.0}}, BASELINE, 0.2)
+    assert regressions == ['api_data@10000 time_s: 1.5 > 1.0 (+20%)']
+
+def test_stage_missing_from_the_baseline_fails():
+    regressions = compare({'render@10000': {'time_s': 1.0, 'peak_mb': 1.0}}, BASELINE, 0.2)
+    assert regressions == ['render@10000: not in the baseline, run with --update-baseline to add it']
+
+def test_metric_missing_from_the_baseline_fails():
+    regressions = compare({'api_data@10000': {'time_s': 1.0, 'rss_mb': 50.0}}, BASELINE, 0.2)
+    assert regressions == ['api_data@10000 rss_mb: not in the baseline, run with --update-baseline to add it']
+
+def allocate(mb):
+    args = [sys.executable, '-c', f"b = bytearray({mb} * 2**20); b[::4096] = b'x' * len(b[::4096])"]
+    return ChildRun(lambda: subprocess.run(args, check=True), args)
+
+def test_child_memory_is_the_peak_rss_of_the_child():
+    # This process is larger than the child, which must not inherit its peak
+    ballast = bytearray(300 * 2**20)
+    ballast[::4096] = b'x' * len(ballast[::4096])
+    small = measure(allocate(20), 1)
+    large = measure(allocate(200), 1)
+    assert 'peak_mb' not in small and small['rss_mb'] < 100
+    assert 200 < large['rss_mb'] < 300
+
+def test_committed_baseline_covers_every_stage():
+    with open(BASELINE_PATH) as json_file:
+        baseline = json.load(json_file)
+    for n in (10000, 100000):
+        for name in STAGES:
+            for workers in worker_counts('1,2') if name in PER_WORKERS else [None]:
+                assert stage_key(name, n, workers) in baseline
+
+def test_worker_counts():
+    assert worker_counts('1,2,N') == sorted({1, 2, os.cpu_count()})
@@ -0,0 +1,114 @@
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+from bitmap_index import BitmapIndex, QueryError
+
+CHECKS = ['Stato_Checklist_Asseverazione', 'Stato_CUP', 'Stato_Anagrafica_SA']
+STATUSES = ['Documento valido', 'Documento errato', 'Verifica manuale', 'Controllo non supportato']
+# The last status is set on under 1 row in 32, so its bitmaps are stored as row arrays
+WEIGHTS = [0.5, 0.3, 0.19, 0.01]
+
+def random_snapshot(rng, ids, skip=0.1):
+    # One status per (candidatura, check), with some checks missing
+    rows = [(candidatura, check, rng.choice(STATUSES, p=WEIGHTS))
+            for candidatura in ids for check in CHECKS if rng.random() > skip]
+    return pd.DataFrame(rows, columns=['candidatureId', 'check', 'status'])
+
+def brute_force(snapshot, query):
+    statuses = snapshot.pivot(index='candidatureId', columns='check', values='status')
+    everyone = set(statuses.index)
+
+    def evaluate(node):
+        if 'and' in node:
+            return set.intersection(*map(evaluate, node['and']))
+        if 'or' in node:
+            return set.union(*map(evaluate, node['or']))
+        if 'not' in node:
+            return everyone - evaluate(node['not'])
+        if 'any' in node:
+            fields = node.get('fields') or list(statuses.columns)
+            return set(statuses.index[statuses.reindex(columns=fields).eq(node['any']).any(axis=1)])
+        values = node['value'] if isinstance(node['value'], list) else [node['value']]
+        if node['field'] not in statuses:
+            return set()
+        return set(statuses.index[statuses[node['field']].isin(values)])
+    return evaluate(query)
+
+QUERIES = [
+    {'field': 'Stato_CUP', 'value': 'Documento errato'},
+    {'field': 'Stato_CUP', 'value': ['Documento errato', 'Verifica manuale']},
+    {'and': [{'field': 'Stato_CUP', 'value': 'Documento valido'}, {'field': 'Stato_Anagrafica_SA', 'value': 'Verifica manuale'}]},
+    {'or': [{'field': 'Stato_CUP', 'value': 'Documento errato'}, {'not': {'field': 'Stato_Checklist_Asseverazione', 'value': 'Documento valido'}}]},
+    {'not': {'any': 'Documento valido'}},
+    {'any': 'Verifica manuale', 'fields': ['Stato_CUP', 'Stato_Anagrafica_SA']},
+    {'or': [{'field': 'Stato_CUP', 'value': 'Controllo non supportato'}, {'field': 'Stato_Anagrafica_SA', 'value': 'Controllo non supportato'}]},
+    {'field': 'Stato_Sconosciuto', 'value': 'Documento valido'},
+]
+
+def assert_matches(index, snapshot):
+    for query in QUERIES:
+        expected = brute_force(snapshot, query)
+        result = index.query(query, limit=len(snapshot))
+        assert result['count'] == len(expected), query
+        assert set(result['candidature_ids']) == expected, query
+
+def test_queries_match_brute_force_across_updates():
+    rng = np.random.default_rng(0)
+    ids = [f'CND_{i:06d}' for i in range(3000)]
+    index = BitmapIndex()
+    snapshot = random_snapshot(rng, ids)
+    index.update(snapshot)
+    assert any(bitmap.dtype == np.uint32 for bitmap in index.version.bitmaps.values())
+    assert any(bitmap.dtype == np.uint64 for bitmap in index.version.bitmaps.values())
+    assert_matches(index, snapshot)
+
+    # Changed statuses, dropped and new candidature
+    ids = ids[500:] + [f'CND_{i:06d}' for i in range(3000, 3400)]
+    snapshot = random_snapshot(rng, ids)
+    index.update(snapshot)
+    assert_matches(index, snapshot)
+
+    # A check dropped from the whole dataset
+    snapshot = snapshot[snapshot['check'] != 'Stato_Anagrafica_SA']
+    index.update(snapshot)
+    assert_matches(index, snapshot)
+
+def test_paging_follows_row_order():
+    rng = np.random.default_rng(1)
+    snapshot = random_snapshot(rng, [f'CND_{i:06d}' for i in range(1000)], skip=0)
+    index = BitmapIndex()
+    index.update(snapshot)
+    query = {'field': 'Stato_CUP', 'value': 'Documento valido'}
+    everything = index.query(query, limit=1000)['candidature_ids']
+    pages = [index.query(query, offset=offset, limit=50)['candidature_ids'] for offset in range(0, len(everything), 50)]
+    assert sum(pages, []) == everything
+
+def test_queries_during_update_see_one_version():
+    rng = np.random.default_rng(2)
+    ids = [f'CND_{i:06d}' for i in range(2000)]
+    snapshots = [random_snapshot(rng, ids), random_snapshot(rng, ids)]
+    query = {'and': [{'field': 'Stato_CUP', 'value': 'Documento valido'}, {'not': {'any': 'Documento errato'}}]}
+    expected = [brute_force(snapshot, query) for snapshot in snapshots]
+    index = BitmapIndex()
+    index.update(snapshots[0])
+
+    stop = threading.Event()
+    def updater():
+        for i in range(20):
+            index.update(snapshots[(i + 1) % 2])
+        stop.set()
+    thread = threading.Thread(target=updater)
+    thread.start()
+    results = []
+    while not stop.is_set():
+        results.append(set(index.query(query, limit=len(ids))['candidature_ids']))
+    thread.join()
+    assert results and all(result in expected for result in results)
+
+def test_invalid_query():
+    index = BitmapIndex()
+    with pytest.raises(QueryError):
+        index.query({'and': []})
+    with pytest.raises(QueryError):
+        index.query({'field': 'Stato_CUP'})
@@ -0,0 +1,53 @@
+import pandas as pd
+import pytest
+from reconciliation import reconcile, MISSING_DOCUMENT
+from check_reports import check_status, NOT_SUPPORTED
+
+def reconciled_cup(cup_candidature):
+    master = pd.DataFrame({'Candidatura': ['A', 'B', 'C', 'D']})
+    # C is missing from the report of the asseverazione PDFs, D is listed there without its PDF
+    file_status_report = pd.DataFrame({'Candidatura': ['A', 'B', 'D'], 'Status': ['Firma presente', 'Firma presente', MISSING_DOCUMENT]})
+    cup_report = pd.DataFrame({'Candidatura': cup_candidature, 'Stato_CUP': 'Codice corretto'})
+    return reconcile(master, {'Stato_Checklist_Asseverazione': file_status_report, 'Stato_CUP': cup_report})
+
+def test_skipped_candidatura_is_not_supported():
+    reconciled = reconciled_cup(['A'])
+    index = reconciled.reports['Stato_Checklist_Asseverazione'].index
+    status = check_status(reconciled, 'Stato_CUP', index)
+    assert status.to_dict() == {'A': 'Codice corretto', 'B': NOT_SUPPORTED, 'C': MISSING_DOCUMENT, 'D': MISSING_DOCUMENT}
+
+def test_check_without_report_is_not_supported():
+    reconciled = reconciled_cup(['A', 'B'])
+    index = reconciled.reports['Stato_Checklist_Asseverazione'].index
+    assert check_status(reconciled, 'Stato_Anagrafica_SA', index) == NOT_SUPPORTED
+
+@pytest.mark.parametrize('check, env, value', [
+    ('Stato_CUP', 'CUP_REPORT_PATH', 'Codice corretto'),
+    ('Stato_Anagrafica_SA', 'ANAGRAFICA_REPORT_PATH', 'Dati corretti'),
+])
+def test_generate_data_keeps_missing_document_for_missing_pdf(tmp_path, monkeypatch, check, env, value):
+    from synthetic_data import write_dataset
+    paths = write_dataset(200, str(tmp_path), seed=3, formats=('parquet', 'excel'), missing_rate=0.1)
+    file_status_report = pd.read_excel(paths['excel'])
+    # PDFs missing from the report or listed there as missing
+    with_pdf = file_status_report.loc[file_status_report['Status'] != MISSING_DOCUMENT, 'Candidatura']
+    # The script ran on half of the PDFs only
+    checked = with_pdf.iloc[::2]
+    report_path = str(tmp_path / 'check_report.parquet')
+    pd.DataFrame({'Candidatura': checked, check: value}).to_parquet(report_path, index=False)
+    monkeypatch.setenv('PARQUET_PATH', paths['parquet'])
+    monkeypatch.setenv('EXCEL_PATH', paths['excel'])
+    for other in ('CUP_REPORT_PATH', 'ANAGRAFICA_REPORT_PATH'):
+        monkeypatch.delenv(other, raising=False)
+    monkeypatch.setenv(env, report_path)
+
+    import app_v2
+    _, df_checklist = app_v2.generate_data()
+    has_pdf = df_checklist.index.isin(with_pdf)
+    listed_missing = df_checklist.index.isin(file_status_report['Candidatura']) & ~has_pdf
+    assert (~df_checklist.index.isin(file_status_report['Candidatura'])).any() and listed_missing.any()
+    status = df_checklist[check]
+    assert (status[~has_pdf] == MISSING_DOCUMENT).all()
+    assert (df_checklist.loc[~has_pdf, 'Stato_Firma_Asseveratore'] == MISSING_DOCUMENT).all()
+    assert (status[df_checklist.index.isin(checked)] == value).all()
+    assert (status[has_pdf & ~df_checklist.index.isin(checked)] == NOT_SUPPORTED).all()
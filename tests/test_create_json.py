@@ -0,0 +1,41 @@
+import os
+import json
+import pandas as pd
+import pytest
+from create_json_candidature import write_sharded, build_candidatura, MANIFEST_NAME, PARTS_DIR
+from lean_json import iter_manifest
+
+def output_files(out_dir):
+    names = [MANIFEST_NAME] + [os.path.join(PARTS_DIR, name) for name in sorted(os.listdir(os.path.join(out_dir, PARTS_DIR)))]
+    files = {}
+    for name in names:
+        with open(os.path.join(out_dir, name), 'rb') as output_file:
+            files[name] = output_file.read()
+    return files
+
+def sort_documents(documents):
+    return sorted(documents, key=lambda doc: (doc['candidatureId'], doc['documentClass']))
+
+@pytest.mark.parametrize('part_format', ['json', 'ndjson', 'parquet'])
+def test_sharded_output_is_byte_identical(dataset, tmp_path, part_format):
+    report = pd.read_excel(dataset['excel'])
+    first, second = str(tmp_path / 'first'), str(tmp_path / 'second')
+    write_sharded(report, first, 4, part_format, workers=2)
+    # Rows in another order and another number of workers
+    write_sharded(report.sample(frac=1, random_state=1), second, 4, part_format, workers=1)
+
+    files = output_files(first)
+    assert len(files) == 5
+    assert files == output_files(second)
+
+    # The parts hold the same documents as a single candidatura.json
+    expected = json.loads(json.dumps(build_candidatura(report)))
+    assert sort_documents(iter_manifest(os.path.join(first, MANIFEST_NAME))) == sort_documents(expected)
+
+def test_rewrite_removes_stale_parts(dataset, tmp_path):
+    report = pd.read_excel(dataset['excel'])
+    out_dir = str(tmp_path)
+    write_sharded(report, out_dir, 4, 'json', workers=1)
+    write_sharded(report, out_dir, 2, 'ndjson', workers=1)
+    assert sorted(os.listdir(os.path.join(out_dir, PARTS_DIR))) == [
+        'part-00000-of-00002.ndjson', 'part-00001-of-00002.ndjson']
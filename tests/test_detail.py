@@ -0,0 +1,24 @@
+import os
+
+def test_detail_version_is_an_opaque_token(client, dataset):
+    candidatura_id = client.get('/api/data').get_json()['candidature_ids'][0]
+    detail = client.get(f'/api/detail/{candidatura_id}').get_json()
+    assert detail['query'] and detail['query'][0]['candidatureId'] == candidatura_id
+    # Nothing of the server's filesystem layout reaches the client
+    assert os.path.dirname(dataset['candidatura']) not in detail['version']
+    assert len(detail['version']) == 16
+    assert client.get(f'/api/detail/{candidatura_id}').get_json()['version'] == detail['version']
+
+def test_flattened_documents_are_cached_per_version():
+    from flatten import get_flattened
+    get_flattened.clear()
+    documents = [{'documentClass': 'Doc', 'esitoCheckReason': 'Documento valido',
+                  'dettaglioCheck': [{'nomeCheck': 'Stato_CUP', 'esitoCheck': False, 'Descrizione': 'Codice corretto'}]}]
+    df_documents, details = get_flattened('CND_1', 'v1', documents)
+    assert df_documents.loc['Doc', 'esitoCheckReason'] == 'Documento valido'
+    assert details['Doc'].loc['Stato_CUP', 'Descrizione'] == 'Codice corretto'
+
+    # Same (candidatura, version): served from the cache without looking at the documents
+    assert get_flattened('CND_1', 'v1', None)[0].equals(df_documents)
+    changed = [dict(documents[0], esitoCheckReason='Documento errato')]
+    assert get_flattened('CND_1', 'v2', changed)[0].loc['Doc', 'esitoCheckReason'] == 'Documento errato'
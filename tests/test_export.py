@@ -0,0 +1,28 @@
+import io
+import os
+import subprocess
+import sys
+import pandas as pd
+import pytest
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask_backend')
+
+def test_app_import_does_not_load_export_libraries():
+    code = 'import sys, app_v2; print("openpyxl" in sys.modules)'
+    result = subprocess.run([sys.executable, '-c', code], cwd=BACKEND, env={**os.environ, 'WARM_UP': '0'},
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'False'
+
+@pytest.mark.parametrize('export_format, read', [
+    ('csv', lambda body: pd.read_csv(io.BytesIO(body), dtype=str, keep_default_na=False)),
+    ('xlsx', lambda body: pd.read_excel(io.BytesIO(body), dtype=str).fillna('')),
+    ('parquet', lambda body: pd.read_parquet(io.BytesIO(body))),
+])
+def test_export_matches_matrix(client, export_format, read):
+    query = 'sort=candidatureId&q=CND_14'
+    matrix = client.get(f'/api/matrix?{query}&limit=10000').get_json()
+    exported = read(client.get(f'/api/export?{query}&format={export_format}').get_data())
+
+    assert len(exported) == matrix['total']
+    expected = pd.DataFrame(matrix['rows'], columns=matrix['columns']).fillna('')
+    assert exported[matrix['columns']].equals(expected.astype(str))
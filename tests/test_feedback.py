@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import feedback
+import store
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_concurrent_edits_are_committed(store_path, tmp_path):
+    writer = feedback.FeedbackWriter(str(tmp_path / 'log'), store_path)
+    threads = [threading.Thread(target=writer.submit, args=(f'CND_{i}', 'Doc', f'nota {i}', 'u')) for i in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    conn = store.connect(store_path)
+    assert wait_for(lambda: conn.execute('SELECT COUNT(*) FROM document_feedback').fetchone()[0] == 50)
+    assert wait_for(lambda: not writer.overlay)
+
+def test_failed_commit_is_retried_without_new_edits(store_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(feedback, 'COMMIT_RETRY_INTERVAL', 0.05)
+    failures = [sqlite3.OperationalError('database is locked')]
+    upsert = feedback.upsert_feedback
+
+    def flaky_upsert(conn, entries):
+        if failures:
+            raise failures.pop()
+        upsert(conn, entries)
+
+    monkeypatch.setattr(feedback, 'upsert_feedback', flaky_upsert)
+    writer = feedback.FeedbackWriter(str(tmp_path / 'log'), store_path)
+    writer.submit('CND_1', 'Doc', 'nota', 'u')
+
+    # No further submit: the timer alone brings the entry to the store, where other workers see it
+    conn = store.connect(store_path)
+    assert wait_for(lambda: 'Doc' in store.load_feedback(conn, 'CND_1'))
+    assert wait_for(lambda: not writer.pending('CND_1'))
+
+def test_stale_overlay_does_not_hide_newer_store_row(store_path, tmp_path):
+    writer = feedback.FeedbackWriter(str(tmp_path / 'log'), store_path)
+    old = {'candidatureId': 'CND_1', 'documentClass': 'Doc', 'userFeedback': 'vecchia',
+           'lastmodifyUsers': 'a', 'modifyTimestamp': '2024-01-01T10:00:00.000000+00:00'}
+    new = dict(old, userFeedback='nuova', lastmodifyUsers='b', modifyTimestamp='2024-01-01T11:00:00.000000+00:00')
+    conn = store.connect(store_path)
+    store.upsert_feedback(conn, [new])
+    # An entry this worker could not commit yet, older than the one written by another worker
+    writer.overlay[('CND_1', 'Doc')] = old
+
+    documents = [{'candidatureId': 'CND_1', 'documentClass': 'Doc', 'userFeedback': '', 'lastmodifyUsers': '', 'modifyTimestamp': ''}]
+    assert feedback.apply_feedback(documents, conn, writer)[0]['userFeedback'] == 'nuova'
+
+    writer.overlay[('CND_1', 'Doc')] = dict(old, userFeedback='recente', modifyTimestamp='2024-01-01T12:00:00.000000+00:00')
+    assert feedback.apply_feedback(documents, conn, writer)[0]['userFeedback'] == 'recente'
+
+def test_rejected_entry_does_not_block_the_batch(store_path, tmp_path):
+    log_dir = str(tmp_path / 'log')
+    writer = feedback.FeedbackWriter(log_dir, store_path)
+    # Bypasses the endpoint validation: the store cannot bind a dict
+    writer.submit('CND_1', 'Doc', {'a': 1}, 'u')
+    writer.submit('CND_2', 'Doc', 'nota', 'u')
+
+    conn = store.connect(store_path)
+    assert wait_for(lambda: 'Doc' in store.load_feedback(conn, 'CND_2'))
+    assert wait_for(lambda: not writer.overlay and not writer.uncommitted)
+    assert store.load_feedback(conn, 'CND_1') == {}
+    assert os.path.getsize(os.path.join(log_dir, f'feedback-{os.getpid()}.log')) == 0
+
+def test_replay_skips_rejected_entries(store_path, tmp_path):
+    log_dir = tmp_path / 'log'
+    log_dir.mkdir()
+    entry = {'candidatureId': 'CND_1', 'documentClass': 'Doc', 'userFeedback': 'nota',
+             'lastmodifyUsers': 'u', 'modifyTimestamp': '2024-01-01T10:00:00.000000+00:00'}
+    # Log left by a worker that died with a bad entry before the good one
+    with open(log_dir / 'feedback-1.log', 'w') as log_file:
+        log_file.write(json.dumps(dict(entry, candidatureId='CND_0', userFeedback={'a': 1})) + '\n')
+        log_file.write(json.dumps(entry) + '\n')
+
+    feedback.FeedbackWriter(str(log_dir), store_path)
+    conn = store.connect(store_path)
+    assert store.load_feedback(conn, 'CND_1')['Doc']['userFeedback'] == 'nota'
+    assert not (log_dir / 'feedback-1.log').exists()
+
+def test_patch_requires_string_fields(client):
+    candidatura_id = client.get('/api/data').get_json()['candidature_ids'][0]
+    document_class = client.get(f'/api/detail/{candidatura_id}').get_json()['query'][0]['documentClass']
+    url = f'/api/detail/{candidatura_id}/{document_class}'
+    for payload in ({'userFeedback': {'a': 1}, 'username': 'u'}, {'userFeedback': ['nota'], 'username': 'u'},
+                    {'userFeedback': 'nota', 'username': 7}, {'userFeedback': 'nota'}):
+        assert client.patch(url, json=payload).status_code == 400
+    response = client.patch(url, json={'userFeedback': 'nota', 'username': 'u'})
+    assert response.status_code == 200
+    assert response.get_json()['userFeedback'] == 'nota'
@@ -0,0 +1,24 @@
+import pytest
+
+@pytest.fixture
+def runs(client, tmp_path, monkeypatch):
+    monkeypatch.setenv('HISTORY_PATH', str(tmp_path / 'history'))
+    for run_date in ('20240805', '20240812'):
+        assert client.post('/api/history/snapshot', json={'run_date': run_date}).status_code == 201
+    return client
+
+def test_history_diff_of_identical_runs(runs):
+    diff = runs.get('/api/history/diff?da=20240805&a=20240812').get_json()
+    assert diff['total'] == 0 and diff['changes'] == []
+
+@pytest.mark.parametrize('query', ['offset=-1', 'limit=0', 'limit=-5', 'limit=10001', 'offset=x'])
+def test_history_diff_rejects_invalid_paging(runs, query):
+    response = runs.get(f'/api/history/diff?da=20240805&a=20240812&{query}')
+    assert response.status_code == 400
+
+@pytest.mark.parametrize('run_date', [20240805, '2024-08-05', None, ['20240805']])
+def test_snapshot_rejects_invalid_run_date(client, tmp_path, monkeypatch, run_date):
+    monkeypatch.setenv('HISTORY_PATH', str(tmp_path / 'history'))
+    response = client.post('/api/history/snapshot', json={'run_date': run_date})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,13 @@
+import pytest
+
+def test_matrix_pages(client):
+    first = client.get('/api/matrix?limit=10').get_json()
+    assert first['total'] == 2000 and len(first['rows']) == 10
+    last = client.get('/api/matrix?offset=1995&limit=10').get_json()
+    assert len(last['rows']) == 5
+
+@pytest.mark.parametrize('query', ['limit=-1', 'limit=0', 'limit=10001', 'offset=-1', 'offset=abc', 'limit=1.5'])
+def test_matrix_rejects_invalid_paging(client, query):
+    response = client.get(f'/api/matrix?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,27 @@
+import pytest
+
+QUERY = {'field': 'Stato_Firma_Asseveratore', 'value': 'Firma presente'}
+
+def test_query_pages(client):
+    result = client.post('/api/query', json={'query': QUERY, 'limit': 5}).get_json()
+    assert result['count'] > 5 and len(result['candidature_ids']) == 5
+
+@pytest.mark.parametrize('paging', [{'limit': 'abc'}, {'offset': 'abc'}, {'limit': None}, {'offset': -1}, {'limit': 0}, {'limit': 10001}])
+def test_query_rejects_invalid_paging(client, paging):
+    response = client.post('/api/query', json={'query': QUERY, **paging})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+@pytest.mark.parametrize('query', [
+    {'field': 'Stato_CUP', 'value': {'a': 1}},
+    {'field': 'Stato_CUP', 'value': [['Codice corretto']]},
+    {'field': ['Stato_CUP'], 'value': 'Codice corretto'},
+    {'any': 'Codice corretto', 'fields': 'Stato_CUP'},
+    {'any': ['Codice corretto']},
+    {'not': 'Stato_CUP'},
+    {'and': [QUERY, 'Stato_CUP']},
+])
+def test_query_rejects_invalid_nodes(client, query):
+    response = client.post('/api/query', json={'query': query})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
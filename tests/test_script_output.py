@@ -0,0 +1,53 @@
+import os
+import sys
+import json
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pandas as pd
+from text_store import STORE_SCHEMA
+
+def write_store(path, candidature_text):
+    paths = [f'/pdf/{candidatura}_checklist.pdf' for candidatura in candidature_text]
+    store = {'path': paths, 'size': [1] * len(paths), 'mtime_ns': [1] * len(paths),
+             'text': list(candidature_text.values()), 'error': [''] * len(paths)}
+    pq.write_table(pa.Table.from_pydict(store, schema=STORE_SCHEMA), path)
+
+def run_main(main, monkeypatch, *argv):
+    monkeypatch.setattr(sys, 'argv', ['script', *argv])
+    main()
+
+def test_cup_check_creates_the_out_directory(tmp_path, monkeypatch):
+    from cup_check import main
+    store_path = str(tmp_path / 'text_store.parquet')
+    write_store(store_path, {'CND_141SCU0422X_015254': 'CUP: J12H22000010006'})
+    expected = str(tmp_path / 'expected.csv')
+    pd.DataFrame({'Candidatura': ['CND_141SCU0422X_015254'], 'CUP': ['J12H22000010006']}).to_csv(expected, index=False)
+    out = str(tmp_path / 'reports' / 'cup_report.parquet')
+
+    run_main(main, monkeypatch, str(tmp_path), expected, '--store', store_path, '--skip-extraction', '--out', out)
+    assert pd.read_parquet(out)['Stato_CUP'].tolist() == ['Codice corretto']
+
+def test_anagrafica_sa_creates_the_out_directory(tmp_path, monkeypatch):
+    from anagrafica_sa import main
+    store_path = str(tmp_path / 'text_store.parquet')
+    write_store(store_path, {'CND_141SCU0422X_015254': 'Soggetto attuatore: Comune di Roma\nCodice fiscale: 02438750586'})
+    registry = str(tmp_path / 'registry.csv')
+    pd.DataFrame({'Codice_fiscale': ['02438750586'], 'Denominazione': ['Comune di Roma']}).to_csv(registry, index=False)
+    out = str(tmp_path / 'reports' / 'anagrafica_report.parquet')
+
+    run_main(main, monkeypatch, str(tmp_path), registry, '--store', store_path, '--skip-extraction', '--out', out)
+    assert pd.read_parquet(out)['Stato_Anagrafica_SA'].tolist() == ['Dati corretti']
+
+def test_create_json_creates_the_out_directory(dataset, tmp_path, monkeypatch):
+    from create_json_candidature import main
+    # No .env in the working directory, only the report of the asseverazione PDFs
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('EXCEL_PATH', dataset['excel'])
+    for env in ('PARQUET_PATH', 'CUP_REPORT_PATH', 'ANAGRAFICA_REPORT_PATH'):
+        monkeypatch.delenv(env, raising=False)
+    out = str(tmp_path / 'json' / 'data')
+
+    run_main(main, monkeypatch, '--out', out)
+    with open(os.path.join(out, 'candidature.json')) as json_file:
+        assert len(json.load(json_file)) == len(pd.read_excel(dataset['excel']))
+    assert os.path.exists(os.path.join(out, 'candidatura.json'))
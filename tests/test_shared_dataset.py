@@ -0,0 +1,62 @@
+import os
+import json
+import multiprocessing
+import shared_dataset
+from shared_dataset import ensure_published, source_version, read_version, SharedDataset
+
+def publish_and_read(source_path, shared_path, publish_log, barrier, results):
+    original = shared_dataset.publish
+
+    def logged_publish(documents, path, version):
+        with open(publish_log, 'a') as log_file:
+            log_file.write(f'{os.getpid()}\n')
+        original(documents, path, version)
+    shared_dataset.publish = logged_publish
+
+    barrier.wait()
+    version = source_version(source_path)
+    ensure_published(source_path, shared_path, version)
+    dataset = SharedDataset(shared_path)
+    results.put((dataset.version == version, dataset.table.num_rows))
+
+def test_one_process_publishes_while_the_others_wait(dataset, tmp_path):
+    shared_path = str(tmp_path / 'candidatura.arrow')
+    publish_log = str(tmp_path / 'publish.log')
+    context = multiprocessing.get_context('fork')
+    barrier, results = context.Barrier(4), context.Queue()
+    processes = [context.Process(target=publish_and_read, args=(dataset['candidatura'], shared_path, publish_log, barrier, results))
+                 for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    with open(dataset['candidatura']) as json_file:
+        documents = len(json.load(json_file))
+    assert sorted(results.get(timeout=5) for _ in processes) == [(True, documents)] * 4
+    with open(publish_log) as log_file:
+        assert len(log_file.readlines()) == 1
+    # No temporary file is left next to the shared one
+    assert sorted(os.listdir(tmp_path)) == ['candidatura.arrow', 'candidatura.arrow.lock', 'publish.log']
+
+def test_new_source_version_is_published_beside_attached_readers(tmp_path):
+    source_path = str(tmp_path / 'candidatura.json')
+    shared_path = str(tmp_path / 'candidatura.arrow')
+    documents = [{'candidatureId': f'CND_{i}', 'documentClass': 'Stato_CUP', 'esitoCheckReason': 'Documento valido'} for i in range(3)]
+    with open(source_path, 'w') as json_file:
+        json.dump(documents, json_file)
+    ensure_published(source_path, shared_path, source_version(source_path))
+    attached = SharedDataset(shared_path)
+
+    documents[1]['esitoCheckReason'] = 'Documento errato'
+    with open(source_path, 'w') as json_file:
+        json.dump(documents, json_file)
+    os.utime(source_path, ns=(0, os.stat(source_path).st_mtime_ns + 1))
+    version = source_version(source_path)
+    ensure_published(source_path, shared_path, version)
+
+    assert read_version(shared_path) == version
+    assert SharedDataset(shared_path).get('CND_1')[0]['esitoCheckReason'] == 'Documento errato'
+    # The reader attached before the rename keeps its own mapping
+    assert attached.get('CND_1')[0]['esitoCheckReason'] == 'Documento valido'
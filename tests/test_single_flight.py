@@ -0,0 +1,161 @@
+import os
+import signal
+import threading
+import time
+import pytest
+from concurrent.futures import TimeoutError
+from single_flight import SingleFlight
+
+def blocking_load(started, release, value):
+    def load():
+        started.set()
+        release.wait(10)
+        return value
+    return load
+
+def test_concurrent_callers_share_one_load():
+    single_flight = SingleFlight('test')
+    calls = []
+    barrier = threading.Barrier(10)
+
+    def load():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'data'
+
+    results = []
+    def call():
+        barrier.wait()
+        results.append(single_flight.do('v1', load))
+
+    threads = [threading.Thread(target=call) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ['data'] * 10
+    assert len(calls) == 1
+
+def test_stale_value_is_returned_while_reloading():
+    single_flight = SingleFlight('test')
+    started, release = threading.Event(), threading.Event()
+    assert single_flight.do('v2', blocking_load(started, release, 'new'), stale='old') == 'old'
+    assert started.wait(5)
+    # The refresh is still running: later callers get the stale value too, without a second load
+    assert single_flight.do('v2', lambda: pytest.fail('loaded twice'), stale='old') == 'old'
+    release.set()
+
+def test_waiter_gives_up_on_a_stuck_load(monkeypatch):
+    monkeypatch.setenv('SINGLE_FLIGHT_TIMEOUT', '0.1')
+    single_flight = SingleFlight('test')
+    started, release = threading.Event(), threading.Event()
+    leader = threading.Thread(target=single_flight.do, args=('v1', blocking_load(started, release, 'stuck')))
+    leader.start()
+    assert started.wait(5)
+
+    with pytest.raises(TimeoutError):
+        single_flight.do('v1', lambda: 'unused')
+    # The stuck load is forgotten: the next caller loads again instead of waiting on it
+    assert single_flight.do('v1', lambda: 'fresh') == 'fresh'
+    release.set()
+    leader.join()
+
+def test_late_leader_keeps_the_load_that_replaced_it(monkeypatch):
+    monkeypatch.setenv('SINGLE_FLIGHT_TIMEOUT', '0.1')
+    single_flight = SingleFlight('test')
+    stuck_started, stuck_release = threading.Event(), threading.Event()
+    stuck = threading.Thread(target=single_flight.do, args=('v1', blocking_load(stuck_started, stuck_release, 'stuck')))
+    stuck.start()
+    assert stuck_started.wait(5)
+    with pytest.raises(TimeoutError):
+        single_flight.do('v1', lambda: 'unused')
+
+    # A new leader replaces the stuck load, then the stuck one finishes
+    started, release = threading.Event(), threading.Event()
+    results = []
+    leader = threading.Thread(target=lambda: results.append(single_flight.do('v1', blocking_load(started, release, 'fresh'))))
+    leader.start()
+    assert started.wait(5)
+    stuck_release.set()
+    stuck.join()
+
+    # Later callers still wait on the new load instead of starting a third one
+    monkeypatch.setenv('SINGLE_FLIGHT_TIMEOUT', '5')
+    waiter = threading.Thread(target=lambda: results.append(single_flight.do('v1', lambda: pytest.fail('loaded twice'))))
+    waiter.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    waiter.join()
+    assert results == ['fresh', 'fresh']
+
+def run_in_child(check):
+    # check() runs in a forked child; a hang or an exception is a failure
+    pid = os.fork()
+    if pid == 0:
+        signal.alarm(10)
+        try:
+            check()
+            os._exit(0)
+        except BaseException:
+            os._exit(1)
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status)
+
+def test_forked_child_does_not_wait_on_parent_load():
+    single_flight = SingleFlight('test')
+    started, release = threading.Event(), threading.Event()
+    leader = threading.Thread(target=single_flight.do, args=('v1', blocking_load(started, release, 'parent')))
+    leader.start()
+    assert started.wait(5)
+
+    def check():
+        assert single_flight.do('v1', lambda: 'child') == 'child'
+
+    assert run_in_child(check) == 0
+    release.set()
+    leader.join()
+
+def test_forked_worker_runs_its_own_warm_up(client, monkeypatch):
+    import app_v2
+    monkeypatch.setenv('WARM_UP', '1')
+    # State of a preloading master whose warm-up had not finished when it forked
+    monkeypatch.setattr(app_v2, '_warm_up', {'pid': os.getpid(), 'ready': False, 'error': None, 'seconds': None})
+
+    def check():
+        while client.get('/readyz').status_code != 200:
+            time.sleep(0.01)
+
+    assert run_in_child(check) == 0
+
+def test_forked_worker_warms_up_before_any_request(client, monkeypatch):
+    import app_v2
+    monkeypatch.setenv('WARM_UP', '1')
+    monkeypatch.setattr(app_v2, '_warm_up', {'pid': os.getpid(), 'ready': False, 'error': None, 'seconds': None})
+
+    def check():
+        # No request reaches the worker, the fork alone starts its warm-up
+        assert app_v2._warm_up['pid'] == os.getpid()
+        while not app_v2._warm_up['ready']:
+            time.sleep(0.01)
+
+    assert run_in_child(check) == 0
+
+def test_failed_warm_up_is_retried(client, dataset, tmp_path, monkeypatch):
+    import shutil
+    import app_v2
+    monkeypatch.setenv('WARM_UP', '1')
+    monkeypatch.setattr(app_v2, 'WARM_UP_RETRY_DELAY', 0.05)
+    monkeypatch.setattr(app_v2, '_warm_up', {'pid': None, 'ready': False, 'error': None, 'seconds': None})
+    # The dataset appears only after the process started
+    candidatura_path = str(tmp_path / 'candidatura.json')
+    monkeypatch.setenv('CANDIDATURA_PATH', candidatura_path)
+
+    deadline = time.monotonic() + 5
+    while client.get('/readyz').get_json()['status'] != 'failed':
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    shutil.copy(dataset['candidatura'], candidatura_path)
+    while client.get('/readyz').status_code != 200:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
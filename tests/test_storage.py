@@ -0,0 +1,149 @@
+import io
+import os
+import json
+import pytest
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+moto_server = pytest.importorskip('moto.server')
+pytest.importorskip('s3fs')
+boto3 = pytest.importorskip('boto3')
+
+import storage
+
+BUCKET = 'controlli'
+
+@pytest.fixture(scope='module')
+def endpoint():
+    server = moto_server.ThreadedMotoServer(ip_address='127.0.0.1', port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f'http://{host}:{port}'
+    server.stop()
+
+@pytest.fixture
+def s3(endpoint, tmp_path, monkeypatch):
+    monkeypatch.setenv('S3_ENDPOINT_URL', endpoint)
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('STORAGE_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setenv('STORAGE_REVALIDATE_SECONDS', '0')
+    monkeypatch.setattr(storage, '_fs', None)
+    monkeypatch.setattr(storage, '_validated', {})
+    client = boto3.client('s3', endpoint_url=endpoint)
+    client.create_bucket(Bucket=BUCKET)
+    yield client
+    for page in client.get_paginator('list_objects_v2').paginate(Bucket=BUCKET):
+        for obj in page.get('Contents', []):
+            client.delete_object(Bucket=BUCKET, Key=obj['Key'])
+    client.delete_bucket(Bucket=BUCKET)
+
+def delta(before):
+    after = storage.storage_stats()
+    return {kind: after[kind] - before[kind] for kind in after}
+
+def test_local_path_revalidates_against_etag(s3):
+    # Changes are made through another client, as another writer of the bucket would
+    s3.put_object(Bucket=BUCKET, Key='report.json', Body=b'{"v": 1}')
+    uri = f's3://{BUCKET}/report.json'
+
+    before = storage.storage_stats()
+    path = storage.local_path(uri)
+    assert open(path, 'rb').read() == b'{"v": 1}'
+    assert delta(before) == {'fetched': 8, 'cached': 0}
+
+    # Unchanged object: same ETag, served from the cache
+    before = storage.storage_stats()
+    assert storage.local_path(uri) == path
+    assert delta(before) == {'fetched': 0, 'cached': 8}
+
+    # Changed object: new ETag, fetched again
+    s3.put_object(Bucket=BUCKET, Key='report.json', Body=b'{"v": 22}')
+    before = storage.storage_stats()
+    assert open(storage.local_path(uri), 'rb').read() == b'{"v": 22}'
+    assert delta(before) == {'fetched': 9, 'cached': 0}
+
+def test_revalidation_ignores_listing_cache(s3):
+    s3.put_object(Bucket=BUCKET, Key='runs/report.json', Body=b'1')
+    uri = f's3://{BUCKET}/runs/report.json'
+    storage.local_path(uri)
+    # A listing fills the s3fs directory cache, which must not answer the ETag check
+    storage.get_filesystem().ls(f'{BUCKET}/runs')
+    s3.put_object(Bucket=BUCKET, Key='runs/report.json', Body=b'2')
+    assert open(storage.local_path(uri), 'rb').read() == b'2'
+
+def test_revalidation_window_skips_etag_check(s3, monkeypatch):
+    monkeypatch.setenv('STORAGE_REVALIDATE_SECONDS', '3600')
+    s3.put_object(Bucket=BUCKET, Key='a.json', Body=b'1')
+    uri = f's3://{BUCKET}/a.json'
+    path = storage.local_path(uri)
+    s3.put_object(Bucket=BUCKET, Key='a.json', Body=b'2')
+    before = storage.storage_stats()
+    assert storage.local_path(uri) == path and open(path, 'rb').read() == b'1'
+    assert delta(before) == {'fetched': 0, 'cached': 0}
+
+def test_local_path_fetches_manifest_parts(s3, tmp_path):
+    from create_json_candidature import write_sharded, MANIFEST_NAME
+    from lean_json import iter_documents
+    from synthetic_data import generate_file_status_report
+
+    out_dir = tmp_path / 'out'
+    write_sharded(generate_file_status_report(300, seed=3), str(out_dir), 4, 'ndjson', workers=1)
+    for dirpath, _, filenames in os.walk(out_dir):
+        for filename in filenames:
+            local = os.path.join(dirpath, filename)
+            s3.upload_file(local, BUCKET, f'runs/{os.path.relpath(local, out_dir)}')
+
+    manifest = storage.local_path(f's3://{BUCKET}/runs/{MANIFEST_NAME}')
+    with open(manifest, 'r') as manifest_file:
+        parts = json.load(manifest_file)['parts']
+    assert len(parts) == 4
+    for part in parts:
+        # Each part lands next to the cached manifest, with its relative layout
+        cached = os.path.join(os.path.dirname(manifest), part['path'])
+        assert open(cached, 'rb').read() == open(out_dir / part['path'], 'rb').read()
+    assert sum(1 for _ in iter_documents(manifest)) == sum(part['documents'] for part in parts)
+
+def test_read_parquet_counts_only_the_ranges_read(s3):
+    n = 100_000
+    table = pa.table({
+        'Candidatura': [f'CND_{i:06d}' for i in range(n)],
+        'key': list(range(n)),
+        'payload': [f'{i:08x}' * 8 for i in range(n)],
+    })
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, row_group_size=10_000, compression='none')
+    body = buffer.getvalue()
+    s3.put_object(Bucket=BUCKET, Key='big.parquet', Body=body)
+    uri = f's3://{BUCKET}/big.parquet'
+
+    before = storage.storage_stats()
+    result = storage.read_parquet(uri, columns=['Candidatura'], filters=[('key', '>=', 95_000)])
+    counted = delta(before)['fetched']
+    assert result['Candidatura'].tolist() == [f'CND_{i:06d}' for i in range(95_000, n)]
+
+    # At least the selected column of the one matching row group, never the whole file
+    metadata = pq.ParquetFile(io.BytesIO(body)).metadata
+    selected = metadata.row_group(9).column(0).total_compressed_size
+    assert selected <= counted < len(body) / 4
+
+    # Without a selection the whole file is read; only the footer may be read twice
+    # (pyarrow first reads the last 64 KiB, then the metadata if it is larger)
+    before = storage.storage_stats()
+    assert len(storage.read_parquet(uri)) == n
+    assert len(body) <= delta(before)['fetched'] <= len(body) + 2**16 + metadata.serialized_size
+
+def test_read_parquet_ignores_listing_cache(s3):
+    def upload(n):
+        buffer = io.BytesIO()
+        pq.write_table(pa.table({'Candidatura': [f'CND_{i:06d}' for i in range(n)]}), buffer)
+        s3.put_object(Bucket=BUCKET, Key='runs/master.parquet', Body=buffer.getvalue())
+
+    upload(10)
+    uri = f's3://{BUCKET}/runs/master.parquet'
+    assert len(storage.read_parquet(uri)) == 10
+    storage.get_filesystem().ls(f'{BUCKET}/runs')
+    upload(1000)
+    assert len(storage.read_parquet(uri)) == 1000
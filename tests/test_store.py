@@ -0,0 +1,33 @@
+import threading
+import store
+
+def test_save_lavorata_is_unique_under_concurrency(store_path):
+    barrier = threading.Barrier(8)
+    created = []
+
+    def mark(username):
+        conn = store.connect(store_path)
+        barrier.wait()
+        created.append(store.save_lavorata(conn, 'CND_1', username))
+        conn.close()
+
+    threads = [threading.Thread(target=mark, args=(f'user{i}',)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    conn = store.connect(store_path)
+    assert created.count(True) == 1
+    assert conn.execute('SELECT COUNT(*) FROM candidature_lavorate').fetchone()[0] == 1
+    assert store.is_lavorata(conn, 'CND_1')
+    assert not store.is_lavorata(conn, 'CND_2')
+
+def test_lavorate_endpoints(store_path):
+    import app_v2
+    client = app_v2.app.test_client()
+    assert client.get('/api/lavorate/CND_1').get_json() == {'candidatureId': 'CND_1', 'lavorata': False}
+    assert client.post('/api/lavorate', json={'candidatureId': 'CND_1', 'username': 'u'}).status_code == 201
+    assert client.post('/api/lavorate', json={'candidatureId': 'CND_1', 'username': 'v'}).status_code == 200
+    assert client.get('/api/lavorate/CND_1').get_json()['lavorata'] is True
+    assert client.get('/api/lavorate').get_json() == {'candidature_ids': ['CND_1']}
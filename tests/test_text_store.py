@@ -0,0 +1,46 @@
+import os
+import pytest
+import pyarrow as pa
+import pyarrow.parquet as pq
+from text_store import update_text_store, load_store, STORE_SCHEMA
+
+pymupdf = pytest.importorskip('pymupdf')
+
+def write_pdf(path, text):
+    document = pymupdf.open()
+    document.new_page().insert_text((72, 72), text)
+    document.save(path)
+    document.close()
+
+def test_failed_extraction_is_retried(tmp_path):
+    pdf_dir = tmp_path / 'pdf'
+    pdf_dir.mkdir()
+    path = str(pdf_dir / 'CND_141SCU0422X_015254_checklist.pdf')
+    write_pdf(path, 'CUP J12H22000010006')
+    store_path = str(tmp_path / 'text_store.parquet')
+
+    # A previous run failed on the same file, e.g. with the extractors not installed
+    stat = os.stat(path)
+    failed = {'path': [path], 'size': [stat.st_size], 'mtime_ns': [stat.st_mtime_ns], 'text': [''],
+              'error': ["pdfplumber: No module named 'pdfplumber'"]}
+    pq.write_table(pa.Table.from_pydict(failed, schema=STORE_SCHEMA), store_path)
+
+    texts = update_text_store(str(pdf_dir), store_path, workers=1)
+    assert texts['error'].tolist() == ['']
+    assert 'J12H22000010006' in texts['text'].iloc[0]
+    assert load_store(store_path)['error'].tolist() == ['']
+
+def test_unreadable_file_keeps_its_error(tmp_path, capsys):
+    pdf_dir = tmp_path / 'pdf'
+    pdf_dir.mkdir()
+    (pdf_dir / 'CND_141SCU0422X_015254_checklist.pdf').write_bytes(b'not a pdf')
+    write_pdf(str(pdf_dir / 'CND_141SCU0422X_015255_checklist.pdf'), 'CUP J12H22000010007')
+    store_path = str(tmp_path / 'text_store.parquet')
+
+    first = update_text_store(str(pdf_dir), store_path, workers=1)
+    assert (first['error'] != '').tolist() == [True, False]
+    capsys.readouterr()
+    second = update_text_store(str(pdf_dir), store_path, workers=1)
+    assert second.equals(first)
+    # Only the unreadable file is extracted again
+    assert '1 PDF estratti (1 dopo un errore), 1 dalla cache' in capsys.readouterr().out